@@ -38,20 +38,41 @@ or animation keys change array",
 
 import bpy
 from bpy.app.handlers import persistent
-import random
 import math
 import time
-
-
-# There are 4 pattern presets. One can add further patterns with code adjustments.
-# To add further patterns extent the code close to each of the following FIVE comments.
-# Add your own pattern name above between 
-# Add your own pattern parameters above between
+import collections
+import multiprocessing
+import os
+import numpy as np
+
+# Core without Blender, see rainbowchain/__init__.py. Copy folder rainbowchain
+# next to this file into Blender's add-on folder.
+from rainbowchain import chain
+from rainbowchain.bake import PointCache, bakeFrames
+from rainbowchain.colors import DEFAULT_STOPS, channelScale, channelValues,\
+    paletteRange, paletteTable, scaledColors, stopColors
+from rainbowchain.export import exportChain
+from rainbowchain.expression import customExpressions, default_expressions,\
+    setCustomExpressions
+from rainbowchain.flock import setFrame
+from rainbowchain.loop import Loop
+from rainbowchain.patterns import patternOriginsArray, patternOriginsScalar,\
+    patternTransforms, strideIndex
+from rainbowchain.registry import patternItems, patternOf
+from rainbowchain.state import ChainState
+from rainbowchain.timing import StageTimer
+from rainbowchain.transform import elementTransforms
+
+
+# Pattern presets are registered in rainbowchain/registry.py, see
+# patternItems(). One can add further patterns without changing this file.
+# Write a pattern method, optionally its array version, and register it with
+# rainbowchain.registry.registerPattern(), e.g. from another add-on. Search
+# for the following comments in rainbowchain/patterns.py to see how the
+# built-in patterns do it:
 # Add your own pattern method below 
-# Add your own pattern selection below 
-# Add your own pattern method call below
-# Search for above comments in the code and extent as descripted. Do not remove
-# the comment lines for obvious reasons.
+# Add your own pattern below
+# Registered patterns appear in the pattern menu.
 
 
 class DataContainer():
@@ -76,39 +97,34 @@ class DataContainer():
 # size of approx. 1. This way camera (distance to object, focal length) 
 # can be fix for any x*y array.
         self.scale_factor=0.1
-# Following flags, in combination with look up of previous values, are used
-# to avoid redrawing if parameters have not changed but frame has changed.
+# Following flag and the fingerprint of the last redraw are used to avoid
+# redrawing if parameters have not changed but frame has changed, see
+# parameterFingerprint(). Counters show performed and skipped frame redraws.
         self.drawing_ongoing=False
-        self.handler_called=False
+        self.fingerprint_old=None
+        self.frames_drawn=0
+        self.frames_skipped=0
 
         self.frame_current=1
         self.frame_current_old=self.frame_current
             
-        self.patterns = [
-            ("CLOUD", "Cloud", "", 1),
-            ("SINCOS", "SinCos", "", 2),
-            ("GAUSS", "Gauss", "", 3),
-            ("BOID", "Boid", "", 4),
-            ]
-# Add your own pattern name above between the square brackets in a new like.
+# Pattern enum items of registered patterns, see patternEnumItems().
+        self.patterns=patternItems()
         self.pattern_selection="CLOUD"
-        self.pattern_selection_old=self.pattern_selection="CLOUD"
         self.pattern_isInit=False
 
-# Read the values from the user interface in the following order
-# ("Inner",<Number of Loops>,Step Width>,<Frequency>,<Radius>,<Offset>)
-        self.parameters=[
-            ("Cloud",("Inner",30,1,1,30,1.5),("Outer",30,1,0.5,30,0)),
-            ("SinCos",("Inner",30,1,0.5,30,-1.5),("Outer",30,1,0.5,30,0)),
-            ("Gauss",("Inner",30,0.5,0,30,-7.5),("Outer",30,0.5,1.25,30,-7.5)),
-            ("Boid",("Inner",30,0.05,1,30,-0.6),("Outer",30,0.05,1,30,-0.6)),
-            ]
-# Add your own pattern parameters above between the square brackets in a new like.
-#           ("PatternName",("Inner",30,0.05,1,30,-0.6),("Outer",30,0.05,1,30,-0.6)),
-# Note: 'PatternName', 'Inner' and 'Outer' are used only to improve readability.
-        
-        self.min=2**-126
-        self.max=2**127
+# New objects share one mesh and are created without operator calls, see
+# addObjectsBulk(). Set bulk_add to False to add objects one by one.
+        self.bulk_add=True
+# Redraws write back only elements whose origin changed more than tolerance
+# or whose color changed, see changedElements(). elements_old stores
+# (chain_index.generation,origins,colors) of the last redraw.
+        self.incremental=True
+        self.tolerance=1e-6
+        self.elements_old=None
+# Origins are calculated by the vectorized pattern engine, see patternOrigins().
+# Set vectorized to False to use the per point pattern methods as reference.
+        self.vectorized=True
         
     def update(self):
         scene=bpy.context.scene
@@ -116,104 +132,385 @@ class DataContainer():
 # Get specific material as object from bpy.data library
         self.material= bpy.data.materials.get(self.material_name)  
         self.pattern_selection=scene.select_pattern      
-    
-    def store(self,frame,pattern):
-        scene=bpy.context.scene
-        self.frame_current_old=frame
-        self.pattern_selection_old=pattern
-        
-    def checkChangedProps(self):
-        scene=bpy.context.scene
-        flag1=self.frame_current_old==scene.frame_current
-        flag2=self.pattern_selection_old==self.pattern_selection
 
-        return True and flag1 and flag2
 
+class ChainIndex():
+# Index of the chain's objects 'Objects', 'Objects.0001', 'Objects.0002', ...
+# keyed by suffix number, 'Objects' without suffix has number 0. The index
+# is built once by scanning bpy.data.objects and is invalidated by
+# index_handler() on undo, redo, file load and changed number of objects.
+# Count and handles are then looked up without scanning again. Renamed or
+# removed objects keeping the number of objects are found when their handle
+# is looked up, see lookup().
+    def __init__(self):
+        self.members={}
+        self.valid=False
+        self.object_name=""
+        self.objects_len=-1
+# Generation changes whenever members change, see changedElements().
+        self.generation=0
+
+    def invalidate(self):
+        self.valid=False
+
+# Return suffix number if name belongs to chain otherwise -1.
+    def number(self,name):
+        if name==self.object_name:
+            return 0
+        head,point,suffix=name.rpartition(".")
+        if head==self.object_name and suffix.isdigit():
+            return int(suffix)
+        return -1
+
+    def rebuild(self):
+        self.object_name=data.object_name
+        self.members={}
+        for object in bpy.data.objects:
+            number=self.number(object.name)
+            if number!=-1:
+                self.members[number]=object
+        self.objects_len=len(bpy.data.objects)
+        self.valid=True
+        self.generation=self.generation+1
 
-class Color:
-    def __init__(self,byte):
-        self.factor=pow(2,((byte-1)*8))
-        self.colors=[]
-        self.min=0
-        self.max=255
-        for count in range(self.min, self.max+1,1):
-            self.colors.append(count*self.factor)
+    def update(self):
+        if not self.valid or self.object_name!=data.object_name or\
+                self.objects_len!=len(bpy.data.objects):
+            self.rebuild()
+
+# Add a new object without rebuilding the index.
+    def add(self,object):
+        if not self.valid or self.object_name!=data.object_name:
+            self.rebuild()
+            return
+        number=self.number(object.name)
+        if number!=-1:
+            self.members[number]=object
+            self.generation=self.generation+1
+        self.objects_len=len(bpy.data.objects)
+
+    def count(self):
+        self.update()
+        return len(self.members)
+
+# Return objects of suffix numbers, e.g. ChainState.handles. Names of the
+# returned objects are checked, a removed object raises ReferenceError, the
+# index is rebuilt once on any mismatch. Other members are not checked.
+    def lookup(self,numbers):
+        self.update()
+        objects=[self.members[number] for number in numbers]
+        try:
+            valid=all(self.number(object.name)==number\
+                        for object,number in zip(objects,numbers))
+        except ReferenceError:
+            valid=False
+        if not valid:
+            self.rebuild()
+            objects=[self.members[number] for number in numbers]
+        return objects
+
+# Return objects with suffix number 1 to count in drawing order.
+    def handles(self,count):
+        return self.lookup(range(1,count+1))
+
+
+class RedrawScheduler():
+# Coalesces redraw requests of property updates, e.g. while a slider is
+# dragged. Each request restarts the debounce interval scene.redraw_interval.
+# Intermediate states are dropped, only the latest state is drawn once no
+# request came in for the interval, interval 0 draws requests immediately.
+# settle() is called by the scene update handler of Blender 2.79 and draws
+# once the interval has passed, the add-on does not use bpy.app.timers of
+# later versions.
+# With scene.use_preview each request draws a preview at once, see
+# LevelOfDetail, and the full chain is drawn once the requests settle.
+    def __init__(self):
+        self.pending=False
+        self.requested=0.0
+        self.requests=0
+        self.redraws=0
+        self.previews=0
+        self.previewed=False
+
+    def interval(self):
+        return bpy.context.scene.redraw_interval
+
+    def request(self):
+        if data.pattern_isInit:
+            return
+        self.requests=self.requests+1
+        self.requested=time.perf_counter()
+        if bpy.context.scene.use_preview:
+            self.preview()
+        if self.pending:
+            return
+        self.pending=True
+        if self.interval()==0 and not self.previewed:
+            self.flush(bpy.context.scene.use_progressive)
 
-    def value(self,index):
-        return self.colors[index]
+# Draw a subsampled chain if drawing all elements exceeds the budget.
+    def preview(self):
+        if data.drawing_ongoing:
+            return
+        scene=bpy.context.scene
+        stride=level_of_detail.choose(scene.inner_loops*scene.outer_loops)
+        if stride==1 and not self.previewed:
+            return
+        progressive.cancel()
+        drawObjects(1,1,stride)
+        self.previews=self.previews+1
+        self.previewed=stride>1
+
+# Draw the pending state once no request came in for the interval, also
+# after previews of interval 0.
+    def settle(self):
+        if not self.pending or data.drawing_ongoing:
+            return
+        if time.perf_counter()-self.requested>=self.interval():
+            self.flush(bpy.context.scene.use_progressive)
+
+# Draw pending state now. A progressive redraw replaces a running one and
+# falls back to drawObjects() without a window to run in.
+    def flush(self,use_progressive=False):
+        self.pending=False
+        self.previewed=False
+        self.redraws=self.redraws+1
+        if use_progressive:
+            try:
+                bpy.ops.object.draw_progressive('INVOKE_DEFAULT')
+                return
+            except RuntimeError:
+                progressive.cancel()
+# Pass drawObjects dummy parameters like (1,1) to meet method's definition (self,context).
+        drawObjects(1,1)
 
+    def cancel(self):
+        self.pending=False
 
-# Use example of Colors
-# >>>colors=Colors()
-# >>>colors.Rgb(red,green,blue)
-# red+green*256+blue*256^2      as decimal output
-class RgbColor:
-    """Calculates 3 Byte RGB value"""
+
+class LevelOfDetail():
+# Chooses the stride of preview redraws. Time per element is measured on
+# each redraw, the stride is chosen so that drawing every stride-th row and
+# column takes at most scene.preview_budget milliseconds. Elements left out
+# are hidden until the next full redraw, see park().
     def __init__(self):
-        self.red=Color(1)
-        self.green=Color(2)
-        self.blue=Color(3)
-            
-    def Rgb(self,red,green,blue):
-        return self.red.value(red)+self.green.value(green)+self.blue.value(blue)
-
-
-# Method eval() calculates rainbow color depending on integer value
-class RainbowColor:
-    color=0
-    def eval(self,value):
-        max=255
-        current=value%256
-        value=value%1536
-        if value<256:
-            self.color=color.Rgb(max,current,0)
-        elif value<512:
-            self.color=color.Rgb(max-current,max,0)
-        elif value<768:
-            self.color=color.Rgb(0,max,current)
-        elif value<1024:
-            self.color=color.Rgb(0,max-current,max)
-        elif value<1280:
-            self.color=color.Rgb(current,0,max)
-        elif value<1536:
-            self.color=color.Rgb(max,0,max-current)
-
-        return self.color
-
-
-class LoopData():
-# Example use: x=sin(frequency*angle)*radius 
+# Seconds per element, smoothed over recent redraws.
+        self.cost=0.0
+        self.parked=1
+
+    def measure(self,elements,seconds):
+        if elements==0:
+            return
+        cost=seconds/elements
+        if self.cost==0:
+            self.cost=cost
+        else:
+            self.cost=0.7*self.cost+0.3*cost
+
+# Return stride drawing count elements within budget, 1 draws all.
+    def choose(self,count):
+        budget=bpy.context.scene.preview_budget/1000
+        if self.cost==0 or budget<=0 or count*self.cost<=budget:
+            return 1
+        return int(math.ceil(math.sqrt(count*self.cost/budget)))
+
+# Hide chain objects not drawn by a preview of stride, show all for stride 1.
+# Objects are only touched when the stride changes.
+    def park(self,stride,state):
+        if stride==self.parked:
+            return
+        visible=set(state.handles.tolist())
+        for number,object in chain_index.members.items():
+            if number>0:
+                object.hide=stride>1 and number not in visible
+        self.parked=stride
+
+
+class OriginCache():
+# Least recently used cache of computed origins and colors. Key is the
+# selected pattern plus all inner and outer parameters, thus a frame is
+# found again whenever keyed parameters repeat, e.g. while scrubbing or
+# re-rendering a frame range. Oldest entries are evicted if the size of
+# all entries exceeds scene.cache_budget megabytes.
+    def __init__(self):
+        self.entries=collections.OrderedDict()
+        self.size=0
+        self.hits=0
+        self.misses=0
+
+    def key(self,objects_limit,stride=1):
+        return (data.pattern_selection,inner.parameters(),\
+                outer.parameters(),objects_limit,stride,data.scale_factor,\
+                data.vectorized,colorPalette(),bpy.context.scene.color_channel,\
+                customExpressions(),patternFrame(),transformSettings())
+
+    def budget(self):
+        return bpy.context.scene.cache_budget*2**20
+
+# Return ChainState or None. State must not be changed in place.
+    def get(self,key):
+        state=self.entries.get(key)
+        if state is None:
+            self.misses=self.misses+1
+            return None
+        self.hits=self.hits+1
+        self.entries.move_to_end(key)
+        return state
+
+    def put(self,key,state):
+        size=state.nbytes()
+        if key in self.entries:
+            self.remove(key)
+        if size<=self.budget():
+            self.entries[key]=state
+            self.size=self.size+size
+        while self.entries and self.size>self.budget():
+            self.remove(next(iter(self.entries)))
+
+    def remove(self,key):
+        state=self.entries.pop(key)
+        self.size=self.size-state.nbytes()
+
+    def clear(self):
+        self.entries.clear()
+        self.size=0
+
+
+class ProgressiveRedraw():
+# Draws a chain in chunks of scene.redraw_chunk elements, one chunk per
+# timer event of DrawProgressive, thus Blender stays responsive for large
+# chains. Elements near the center are drawn first. A cancelled redraw
+# keeps the elements written so far and the next redraw writes all
+# elements again, see cancel().
+    def __init__(self):
+        self.running=False
+# Run number, a DrawProgressive operator stops if another run started.
+        self.run=0
+        self.state=None
+        self.order=None
+        self.handles=None
+        self.source=None
+        self.position=0
+        self.progress=0.0
+
+# Calculate state of chain and order of elements to draw. Return True if
+# elements are left to draw by step().
+    def start(self):
+        self.cancel()
+        scene=bpy.context.scene
+        objects_available=checkNumberOfObjects()
+        if not scene.add_objects and not scene.use_instances:
+            if objects_available==0:
+                return False
+        if data.pattern_isInit:
+            return False
+
+        data.update()
+        updateValues()
+        if scene.add_objects or scene.use_instances:
+            objects_limit=None
+        else:
+            objects_limit=objects_available
+        stage_timer.begin()
+        state=chainState(objects_limit)
+        stage_timer.count("elements",len(state))
+        data.drawing_ongoing=True
+        self.run=self.run+1
+        self.running=True
+        self.state=state
+        self.position=0
+        self.progress=0.0
+        self.handles=None
+        self.source=None
+        if scene.use_instances:
+# One vertex cloud, there is nothing to split into chunks.
+            drawInstances(data.material,state)
+            self.order=np.arange(0)
+        elif scene.add_objects:
+            self.source=objectSource(data.material)
+            self.order=nearFirst(state,np.arange(len(state)))
+        else:
+            self.handles=chainObjects(len(state))
+            self.order=nearFirst(state,changedElements(state))
+            level_of_detail.park(1,state)
+        messageLog("Drawing "+str(len(self.order))+" objects, Esc cancels")
+        if len(self.order)==0:
+            self.finish()
+            return False
+        return True
+
+# Draw next chunk. Return True if elements are left to draw.
+    def step(self):
+        scene=bpy.context.scene
+        chunk=self.order[self.position:self.position+scene.redraw_chunk]
+        part=self.state.subset(chunk)
+        with stage_timer.stage("write"):
+            if self.handles is None:
+# Objects are named 1,2,... in order of adding, not by their element, thus a
+# cancelled run leaves a chain without gaps. The next redraw moves them to
+# the elements of their names.
+                part=ChainState(part.origins,part.colors,part.rotations,\
+                    part.scales,np.arange(self.position+1,\
+                    self.position+len(chunk)+1))
+                addObjectsBulk(data.material,part,self.source)
+            else:
+                applyOrigins([self.handles[i] for i in chunk.tolist()],part)
+        self.position=self.position+len(chunk)
+        self.progress=self.position/len(self.order)
+        with stage_timer.stage("scene update"):
+            scene.update()
+        if self.position<len(self.order):
+            return True
+        self.finish()
+        return False
+
+    def finish(self):
+        scene=bpy.context.scene
+# All objects added set flag to False
+        scene.add_objects=False
+        scene.update()
+        self.running=False
+        self.state=None
+        self.handles=None
+        self.source=None
+        self.progress=1.0
+        data.drawing_ongoing=False
+        data.fingerprint_old=parameterFingerprint()
+        messageLog("Drawn "+str(self.position)+" objects")
+
+# Stop drawing. Drawn elements keep their new origins, added objects are
+# kept and become the chain's objects of the next redraw.
+    def cancel(self):
+        if not self.running:
+            return
+        self.running=False
+        self.state=None
+        self.handles=None
+        self.source=None
+        data.drawing_ongoing=False
+        data.elements_old=None
+        bpy.context.scene.add_objects=False
+        messageLog("Drawing cancelled after "+str(self.position)+" of "+\
+                    str(len(self.order))+" objects")
+
+
+class LoopData(Loop):
+# Loop of the add-on, see rainbowchain/loop.py. Keeps default values for
+# the properties and takes parameters from the user interface.
 # frequency   turns/s=2*pi/s=360°/s
-# min to max defines range of loop with step width step
 # for i in range(min,max,1) are max-min steps, last i=max-1
     def __init__(self,loops,step,freq,radius,offset):
+        Loop.__init__(self,loops,step,freq,radius,offset)
         self.loops_default=loops
         self.step_default=step
         self.freq_default=freq
         self.radius_default=radius
         self.offset_default=offset
         
-        self.min=0
         self.count_steps=0
         self.random_offset=0.02
 
-        self.loops=self.loops_default
-        self.step=self.step_default
-        self.freq=self.freq_default
-        self.radius=self.radius_default
-        self.offset=self.offset_default
-
-        self.max=self.loops*self.step
-        self.range=self.max-self.min
-
-        self.loops_old=self.loops_default
-        self.step_old=self.step_default
-        self.freq_old=self.freq_default
-        self.radius_old=self.radius_default
-        self.offset_old=self.offset_default
-    
         self.frame_current=1
-        self.frame_current_old=1
         
 # pass bpy.context.scene for scene
     def update(self,loops,step,freq,radius,offset):
@@ -230,43 +527,6 @@ class LoopData():
 
         scene=bpy.context.scene
         self.frame_current=scene.frame_current
-    
-    def store(self,loops,step,freq,radius,offset):
-        
-        self.loops_old=loops
-        self.step_old=step
-        self.freq_old=freq 
-        self.radius_old=radius
-        self.offset_old=offset
-        
-    def checkChangedProps(self):
-        scene=bpy.context.scene
-
-        flag1=self.loops_old==scene.inner_step
-        flag2=self.step_old==scene.inner_step
-        flag3=self.freq_old==scene.inner_freq
-        flag4=self.radius_old==scene.inner_radius
-        flag5=self.offset_old==scene.inner_offset
-
-        return True and flag1 and flag2 and\
-                         flag3 and flag4 and flag5
-
-# eval_y(x) calculates y based on x y=a*x+b.
-# The function is used because number of loops and steps can be defined freely.
-# Adjustable step width leads to variable maximum of inner and outer loop.
-    def eval_y(self,x):
-# x=counter
-        self.x1=self.min
-        self.x2=self.loops-1
-        self.y1=1
-        self.y2=self.loops*self.step
-#        print("loops",self.loops,"step",self.step)
-        self.a=(self.y2-self.y1)/(self.x2-self.x1)
-        self.b=self.y2-self.a*self.x2
-#        print("x",x,"a",self.a,"b",self.b)
-        self.y=self.a*x+self.b
-#        print("y1",self.y1,"y2",self.y2,"y",self.y)
-        return self.y
 
 
 class DrawObjects(bpy.types.Operator):
@@ -279,10 +539,50 @@ class DrawObjects(bpy.types.Operator):
         return context.active_object is not None
 
     def execute(self, context):
+# Redraw all elements, e.g. after objects have been moved manually.
+        data.elements_old=None
         drawObjects(self,context)
         return {'FINISHED'}
 
 
+class DrawProgressive(bpy.types.Operator):
+    """Draw Rainbow Chains in chunks, press Esc to cancel"""
+    bl_idname = "object.draw_progressive"
+    bl_label = "Draw Progressive"
+
+    def invoke(self, context, event):
+        if not progressive.start():
+            return {'FINISHED'}
+        self.run=progressive.run
+        window_manager=context.window_manager
+        self.timer=window_manager.event_timer_add(0.01,context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0,100)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+# Another redraw started, it draws from now on.
+        if self.run!=progressive.run or not progressive.running:
+            return self.stop(context,{'CANCELLED'})
+        if event.type=='ESC':
+            progressive.cancel()
+            return self.stop(context,{'CANCELLED'})
+        if event.type=='TIMER':
+            running=progressive.step()
+            context.window_manager.progress_update(progressive.progress*100)
+            if context.area is not None:
+                context.area.tag_redraw()
+            if not running:
+                return self.stop(context,{'FINISHED'})
+        return {'PASS_THROUGH'}
+
+    def stop(self, context, result):
+        window_manager=context.window_manager
+        window_manager.event_timer_remove(self.timer)
+        window_manager.progress_end()
+        return result
+
+
 class AddObjects(bpy.types.Operator):
     """Add Rainbow Chain Objects"""
     bl_idname = "object.add_objects"
@@ -305,6 +605,74 @@ class AddObjects(bpy.types.Operator):
 # Properties' definitions see appendPropertiesToSceneContext().
 # Use: row=context.scene.layout.row(), row.prop(scene,"<property name>")
 # Parameter property is its name set in quotation marks. 
+class BakeChain(bpy.types.Operator):
+    """Bake Rainbow Chain of scene frame range to file"""
+    bl_idname = "object.bake_chain"
+    bl_label = "Bake Chain"
+
+    def execute(self, context):
+        scene=context.scene
+        path=bpy.path.abspath(scene.bake_file)
+        if len(path)==0:
+            self.report({'ERROR'},"Set a bake file first.")
+            return {'CANCELLED'}
+        point_cache.close()
+        try:
+            bakeChain(path,scene.frame_start,scene.frame_end)
+        except (OSError,ValueError) as error:
+            self.report({'ERROR'},str(error))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+
+class ExportChain(bpy.types.Operator):
+    """Write Rainbow Chain of current frame to LuxCore scene or PLY file \
+without adding objects"""
+    bl_idname = "object.export_chain"
+    bl_label = "Export Chain"
+
+    def execute(self, context):
+        path=bpy.path.abspath(context.scene.export_file)
+        if len(path)==0:
+            self.report({'ERROR'},"Set an export file first.")
+            return {'CANCELLED'}
+        try:
+            exportChainFile(path)
+        except (OSError,ValueError) as error:
+            self.report({'ERROR'},str(error))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+
+class ExportTiming(bpy.types.Operator):
+    """Write stage times of redraws to timing file, JSON or CSV"""
+    bl_idname = "object.export_timing"
+    bl_label = "Export Timing"
+
+    def execute(self, context):
+        path=bpy.path.abspath(context.scene.timing_file)
+        if len(path)==0:
+            self.report({'ERROR'},"Set a timing file first.")
+            return {'CANCELLED'}
+        stage_timer.write(path)
+        message="Timing written to "+path
+        if stage_timer.writeProfile(path+".prof"):
+            message=message+", profile to "+path+".prof"
+        messageLog(message)
+        return {'FINISHED'}
+
+
+class ResetTiming(bpy.types.Operator):
+    """Clear stage times and profile of redraws"""
+    bl_idname = "object.reset_timing"
+    bl_label = "Reset Timing"
+
+    def execute(self, context):
+        stage_timer.reset()
+        stage_timer.profile=None
+        return {'FINISHED'}
+
+
 class LayoutPanel(bpy.types.Panel):
 #"""Creates a Panel in the scene context of the properties editor"""
     bl_category = "Array One"
@@ -325,11 +693,22 @@ class LayoutPanel(bpy.types.Panel):
         layout.label(text="Set Moves: "+str(inner.loops*outer.loops))
         layout.label(text="Objects availables: "+str(checkNumberOfObjects()))
         layout.label(text="Log: "+str(bpy.context.scene.log_text))
+        layout.label(text="Frames: %d redrawn, %d skipped" %\
+                (data.frames_drawn,data.frames_skipped))
+        layout.label(text="Cache: %d hits, %d misses, %.1f MB" %\
+                (origin_cache.hits,origin_cache.misses,origin_cache.size/2**20))
+        if progressive.running:
+            layout.label(text="Drawing: %5.1f%%, Esc cancels" %\
+                    (progressive.progress*100))
 
 # Create an row where the properties are aligned to each other.
         row = layout.row(align=False)
 # prop_menu_enum(data, property, text="")
         row.prop_menu_enum(scene, "select_pattern", text="Select a pattern.")
+        if scene.select_pattern=="CUSTOM":
+            layout.prop(scene, "custom_x")
+            layout.prop(scene, "custom_y")
+            layout.prop(scene, "custom_z")
       
         layout.label(text="Number of Loops:")  
         row = layout.row(align=True)
@@ -356,9 +735,42 @@ class LayoutPanel(bpy.types.Panel):
         row.prop(scene,"inner_offset")
         row.prop(scene,"outer_offset")
 
+        row = layout.row(align=True)
+        row.prop(scene, "palette", text="")
+        row.prop(scene, "palette_stops")
+        row.prop(scene, "color_channel", text="")
+
+        row = layout.row(align=True)
+        row.prop(scene, "rotation_mode", text="")
+        row.prop(scene, "jitter_seed")
+        row = layout.row(align=True)
+        row.prop(scene, "rotation_jitter")
+        row.prop(scene, "scale_jitter")
+
         row = layout.row(align=True)
         row.prop(scene, "add_objects")
         row.prop(scene, "use_active")
+        row = layout.row(align=True)
+        row.prop(scene, "use_instances")
+        row.prop(scene, "redraw_interval")
+        row = layout.row(align=True)
+        row.prop(scene, "cache_budget")
+        row = layout.row(align=True)
+        row.prop(scene, "use_preview")
+        row.prop(scene, "preview_budget")
+        row = layout.row(align=True)
+        row.prop(scene, "use_progressive")
+        row.prop(scene, "redraw_chunk")
+
+        layout.prop(scene, "bake_file")
+        row = layout.row(align=True)
+        row.prop(scene, "use_bake")
+        row.prop(scene, "bake_processes")
+        row.operator("object.bake_chain")
+
+        row = layout.row(align=True)
+        row.prop(scene, "export_file")
+        row.operator("object.export_chain")
 # prop(anytype object, property, text="") 
 # prop_search(data, property, search_data, search_property, text="")
 
@@ -375,30 +787,82 @@ class LayoutPanel(bpy.types.Panel):
 #        row.operator("object.add_objects")
 
 
-# Defines method for a blender internal event handler. This handler
-# might be called multiple times in a short time. Because drawObject() takes time
-# this method avoids a following call before current drawimg is finished. 
+class TimingPanel(bpy.types.Panel):
+# Stage times of last redraw and session, see StageTimer. Sub-panel of
+# LayoutPanel, Blender before 2.80 shows it as closed panel below.
+    bl_category = "Array One"
+    bl_label = "Rainbow Chains Timing"
+    bl_idname = "SCENE_PT_timing"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS'
+    bl_parent_id = "SCENE_PT_layout"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        layout.label(text="Redraws: %d" % stage_timer.redraws)
+        for name,value in stage_timer.counts.items():
+            layout.label(text="%s: %d" % (name,value))
+        for name,calls,total,mean,low,high,last in stage_timer.rows():
+            layout.label(text="%s: %.2f ms, mean %.2f ms, max %.2f ms" %\
+                    (name,last*1000,mean*1000,high*1000))
+
+        row = layout.row(align=True)
+        row.prop(scene, "use_cprofile")
+        row.operator("object.reset_timing")
+        layout.prop(scene, "timing_file")
+        layout.operator("object.export_timing")
+
+
+# Defines method for a blender internal event handler. Frames must be drawn
+# before they are rendered, thus the redraw is not debounced but any pending
+# redraw of the scheduler is done with it. Blender calls handlers from one
+# thread, a call during drawing can only be nested and is skipped. A
+# progressive redraw is cancelled, the frame is drawn at once.
 @persistent
 def post_handler(scene):
-    scene=bpy.context.scene
-    if data.handler_called==False:
-        data.handler_called=True
-        updateValues()
-        print("Frame changed from", data.frame_current_old,"to",data.frame_current)
-        if not checkChangedValues():
-            print("At least one entry has changed. Starting scene redraw...")
-# Pass drawObjects dummy parameters like (1,1) to meet method's definition (self,context).
-# Functions called by property key 'update=' require self and context as paramter. 
-            drawObjects(1,1)
-        data.handler_called=False    
+    progressive.cancel()
+    if data.drawing_ongoing:
+        print("post_handler called during drawing")
+        return
+    data.frame_current_old=data.frame_current
+    data.update()
+    updateValues()
+    print("Frame changed from", data.frame_current_old,"to",data.frame_current)
+    if parameterFingerprint()!=data.fingerprint_old or scheduler.pending:
+        print("At least one entry has changed. Starting scene redraw...")
+        data.frames_drawn=data.frames_drawn+1
+        scheduler.flush()
     else:
-        print("post_handler called at least twice")
-        for i in range(1,10):
-            if data.handler_called:
-                time.sleep(0.05)
-            else:
-                break
-        data.handler_called=False
+        data.frames_skipped=data.frames_skipped+1
+
+
+# Method called by property key 'update='. Functions called by 'update='
+# require self and context as parameter.
+def scheduleRedraw(self, context):
+    scheduler.request()
+
+# Keeps chain_index valid. Undo, redo and file load replace all objects, other
+# scene updates invalidate the index only if the number of objects changed.
+# Renamed objects are found by ChainIndex.lookup() on use.
+@persistent
+def index_handler(scene):
+    if chain_index.objects_len!=len(bpy.data.objects):
+        chain_index.invalidate()
+
+
+# Draws pending redraws once they settle, see RedrawScheduler.
+@persistent
+def settle_handler(scene):
+    scheduler.settle()
+
+
+@persistent
+def index_reset_handler(scene):
+    chain_index.invalidate()
+
 
 def timeCurrent():
     now = time.localtime() 
@@ -426,22 +890,15 @@ def reportProgress(drawings_counter,print_after_drawings):
             messageLog(message)
 
 
-# Check number of available objects containing object_name in name
+# Check number of available objects named object_name or object_name.<number>
 def checkNumberOfObjects():
-    counter=0
-    for i in range(len(bpy.data.objects)):
-        text=str(bpy.data.objects[i])
-        pos_name=text.find(data.object_name)
-        if pos_name != -1: 
-            pos_bracket=text.find(")")
-            if (pos_bracket-pos_name)==(len(data.object_name)+1):
-                counter=counter+1
-            else:
-                pos_point=text.find(".")
-                text_nr=text[pos_point+1:pos_bracket-1]
-                if text_nr.isdigit():
-                    counter=counter+1
-    return counter
+    return chain_index.count()
+
+
+# Return list of the chain's objects 'Objects.0001' to 'Objects.<count>'
+# in drawing order, see ChainIndex.
+def chainObjects(count):
+    return chain_index.handles(count)
 
 
 # Return a string with name only or name plus suffix number 
@@ -484,162 +941,96 @@ def leadingZerosText(digits,text,number):
     
     return text_counter
 
-# list: e.g. (1,2,3)    element: 1 to 3
-def listMax(list,element):
-    max=data.min
-    if element>len(list):
-        return float('nan')
-    elif element<1:
-        return float('nan')
-    else:
-        for i in list:
-            e=i[element-1]
-            if e>max:
-                max=e
-        return max
-
-# list: e.g. (1,2,3)    element: 1 to 3
-def listMin(list,element):
-    min=data.max
-    if element>len(list):
-        return float('nan')
-    elif element<1:
-        return float('nan')
+# Return ChainState of current frame limited to objects_limit elements,
+# of every stride-th row and column only for stride above 1.
+# Baked frames are read from file, no pattern calculation is required.
+# Keyed parameters repeat during playback, look up computed frames next.
+def chainState(objects_limit,stride=1):
+    scene=bpy.context.scene
+    with stage_timer.stage("bake read"):
+        baked=bakedFrame(scene.frame_current)
+    if baked is not None:
+        origins,colors=baked
+        with stage_timer.stage("transforms"):
+            rotations,scales=chainTransforms(origins,\
+                    np.arange(1,len(origins)+1))
+        state=ChainState(origins,colors,rotations,scales)
+# Rows are limited like computed frames, see limitRows().
+        if objects_limit is not None or stride>1:
+            index=strideIndex(inner,outer,objects_limit,stride)
+            state=state.subset(index[index<len(state)])
+        return state
+    with stage_timer.stage("cache"):
+        key=origin_cache.key(objects_limit,stride)
+        state=origin_cache.get(key)
+    if state is None:
+        with stage_timer.stage("pattern"):
+            origins=patternOrigins(objects_limit,stride)
+        palette=colorPalette()
+        with stage_timer.stage("min/max"):
+            values=channelValues(origins,scene.color_channel)
+            scale=channelScale(values)
+            value_range=paletteRange(palette[0],values)
+        with stage_timer.stage("palette"):
+            table=paletteTable(*palette)
+        with stage_timer.stage("colors"):
+            colors=scaledColors(values,scale,inner.loops*outer.loops,table,\
+                    value_range)
+        handles=np.arange(1,len(origins)+1)
+        if stride>1:
+            handles=strideIndex(inner,outer,objects_limit,stride)+1
+        with stage_timer.stage("transforms"):
+            rotations,scales=chainTransforms(origins,handles,objects_limit,\
+                    stride)
+        state=ChainState(origins,colors,rotations,scales,handles)
+        origin_cache.put(key,state)
+    return state
+
+
+# Return (rotations,scales) of elements, see elementTransforms(). Random
+# rotations and jitter depend on seed and handles only, thus renders of
+# other machines and previews get equal values.
+def chainTransforms(origins,handles,objects_limit=None,stride=1):
+    scene=bpy.context.scene
+    rotations,scales=(None,None)
+    if scene.rotation_mode=="PATTERN":
+        rotations,scales=patternTransforms(data.pattern_selection,inner,outer,\
+                    origins,objects_limit,stride)
+    return elementTransforms(handles,rotations,scales,scene.rotation_mode,\
+                scene.jitter_seed,scene.rotation_jitter,scene.scale_jitter)
+
+
+# Return index sorted by distance of the elements from the center, nearest
+# first. Elements of equal distance keep their order.
+def nearFirst(state,index):
+    index=np.asarray(index,dtype=np.intp)
+    distance=(state.origins[index]**2).sum(axis=1)
+    return index[np.argsort(distance,kind="mergesort")]
+
+
+# Pattern methods are in rainbowchain/patterns.py.
+# Return origins of the selected pattern as (N,3) array. Outer loops are
+# limited to the number of available objects, None means no limit.
+def patternOrigins(objects_available=None,stride=1):
+    if data.vectorized:
+        method=patternOriginsArray
     else:
-        for i in list:
-            e=i[element-1]
-            if e<min:
-                min=e
-        return min
-
-def patternCloud(inner_count,outer_count):
-    inner_cpr=inner_count/inner.range
-    inner_angle=6.283*inner_cpr
-
-    outer_cpr=outer_count/outer.range
-    outer_angle=6.283*outer_cpr
-
-    inner_value=inner.eval_y(inner_count)
-    outer_value=outer.eval_y(outer_count)
-    
-    loops_value=inner_value*outer_value
-    loops_cpr=loops_value/(inner.max*outer.max)
-    loops_angle=6.283*loops_cpr
-    
-    x=math.sin(inner_angle*inner.freq)*inner.radius
-    y=math.cos(inner_angle*inner.freq)*inner.radius
-    x=x+math.sin(loops_angle*outer.freq)*outer.radius
-    y=y+math.cos(loops_angle*outer.freq)*outer.radius
+        method=patternOriginsScalar
+    return method(data.pattern_selection,inner,outer,data.scale_factor,\
+                objects_available,stride)
 
-    z=inner_value%(inner.max+inner.step)*inner.offset
-
-# Return resized axis offset. This is in accordance 
-# with added objects size. 
-    return (x*data.scale_factor,y*data.scale_factor,z*data.scale_factor) 
-
-
-def patternSinCos(inner_count,outer_count):
-    inner_cpr=inner_count/inner.range
-    inner_angle=6.283*inner_cpr
-
-    outer_cpr=outer_count/outer.range
-    outer_angle=6.283*outer_cpr
-
-    inner_value=inner.eval_y(inner_count)
-    outer_value=outer.eval_y(outer_count)
-    
-    loops_value=inner_value*outer_value
-    loops_cpr=loops_value/(inner.max*outer.max)
-    loops_angle=6.283*loops_cpr
-
-# Add +random.random()*<loop_type>.random_offset to get position variances.           
-    x=inner_count
-    y=outer_count
-# z positions may depend on both x and y offsets. Center point is at position 
-# (0,0,0) all other other points have at least one axis offset. 
-    z=math.sin(inner_angle*inner.freq+inner.offset)**2*inner.radius+\
-        math.cos(outer_angle*outer.freq+outer.offset)**2*outer.radius
-
-    return (x*data.scale_factor,y*data.scale_factor,z*data.scale_factor) 
-
-
-def patternGauss(inner_count,outer_count):
-# sigma	s	1
-# µ	        0
-  	
-#  d(s)                a(x),(µ,s)	b(x)	       c(x)	   var	g(x),(µ,s)
-#  1/(s*sqrt(2*pi))    (x-µ)/s	   -1/2*a(x)^2	   e^b(x)	x	d(s)*c(x)
-
-# math.exp(x)  Use ** or the built-in pow()for exact integer powers.
-# math.pi    math.e      math.hypot(x, y) Return the Euclidean norm, sqrt(x*x + y*y).
-    x=inner_count+inner.offset
-    y=outer_count+outer.offset
-    s=outer.freq
-    mu=inner.freq
-    d=1/(s*math.sqrt(2*math.pi))
-    x_a=(x-mu)/s
-    x_b=-0.5*x_a**2
-    x_c=math.exp(x_b)
-    x_g=d*x_c
-    y_a=(y-mu)/s
-    y_b=-0.5*y_a**2
-    y_c=math.exp(y_b)
-    y_g=d*y_c
-    z=x_g*inner.radius+y_g*outer.radius
-    
-    return (x*data.scale_factor,y*data.scale_factor,z*data.scale_factor) 
-
-
-def patternBoid(inner_count,outer_count):
-    inner_cpr=inner_count/inner.range
-    inner_angle=6.283*inner_cpr
-
-    outer_cpr=outer_count/outer.range
-    outer_angle=6.283*outer_cpr
-
-    inner_value=inner.eval_y(inner_count)
-    outer_value=outer.eval_y(outer_count)
-    
-    loops_value=inner_value*outer_value
-    loops_cpr=loops_value/(inner.max*outer.max)
-    loops_angle=6.283*loops_cpr
-    
-#    x=math.sin(inner_angle*inner.freq)*inner.radius+inner.offset
-#    y=math.cos(inner_angle*inner.freq)*inner.radius+inner.offset
 
-    x=inner_count
-    y=outer_count
+# Return enum items of registered patterns. Blender requires a reference
+# to the items, it is kept in data.patterns.
+def patternEnumItems(self, context):
+    data.patterns=patternItems()
+    return data.patterns
 
-    z=-(inner.radius*(x+inner.offset)**2+outer.radius*(y+outer.offset)**2)
-
-    x=inner_count*inner.radius
-    y=outer_count*outer.radius
-    
-# Return resized axis offset. This is in accordance 
-# with added objects size. 
-    return (x*data.scale_factor,y*data.scale_factor,z*data.scale_factor) 
-
-
-# Add your own pattern method below this comment lines in the following style.
-# def patternOwnMethod(inner_count,outer_count):
-# ... code to calculate x,y,z ...
-#   return (x*data.scale_factor,y*data.scale_factor,z*data.scale_factor) 
 
 def patternInitAndDraw(self, context):
     data.pattern_isInit=True
     scene=bpy.context.scene
-    pattern=scene.select_pattern
-    if pattern=="CLOUD":
-        parameter=data.parameters[0]
-    elif pattern=="SINCOS":
-        parameter=data.parameters[1]
-    elif pattern=="GAUSS":
-        parameter=data.parameters[2]
-    elif pattern=="BOID":
-        parameter=data.parameters[3]
-# Add your own pattern selection below this comment lines like
-#   elif pattern=="PATTERNNAME":
-#       parameter=data.parameters[4]
+    parameter=chain.presetParameters(scene.select_pattern)
 
     scene.inner_loops=parameter[1][1]
     scene.inner_step=parameter[1][2]
@@ -656,14 +1047,17 @@ def patternInitAndDraw(self, context):
     data.pattern_isInit=False
     drawObjects(1,1)
 
-def drawObjects(self, context):
+# stride above 1 draws a preview of every stride-th row and column.
+def drawObjects(self, context, stride=1):
+    time_start=time.perf_counter()
     scene=bpy.context.scene
     objects_available=checkNumberOfObjects()
-    if not scene.add_objects:
+    if not scene.add_objects and not scene.use_instances:
         if objects_available==0:
             return
     if data.pattern_isInit:
         return
+    stage_timer.begin()
     
     data.update()
     updateValues()
@@ -673,106 +1067,80 @@ def drawObjects(self, context):
     print_after_drawings=100
     reportProgress(drawings_counter,print_after_drawings)
     data.drawing_ongoing=True
+    if scene.use_cprofile:
+        stage_timer.enable()
 
 # Counter to count total nr. of drawings (inner and outer loop)
     drawings_counter=1
-    drawings_max=inner.loops*outer.loops
-    origins=[]
-
-# Outer loop can be seen as loop for y positions.
-    outer_counter=0
-    outer_count=outer.min
-    while outer_count<outer.max:
-# Check if all existing objects have been moved already because
-# product of loops' user entries is allowed to exceed number of objects.
-        if not scene.add_objects:
-            if objects_available<(drawings_counter-1+inner.loops):
-                break
-# Inner loop can bee seen as loop for x positions.
-        inner_counter=0
-        inner_count=inner.min
-        while inner_count<inner.max:
-        
-            if data.pattern_selection=="CLOUD":
-                origin=patternCloud(inner_count,outer_count)
-            elif data.pattern_selection=="SINCOS":
-                origin=patternSinCos(inner_count,outer_count)
-            elif data.pattern_selection=="GAUSS":
-                origin=patternGauss(inner_count,outer_count)                
-            elif data.pattern_selection=="BOID":
-                origin=patternBoid(inner_count,outer_count)
-# Add your own pattern method call below this comment lines like
-#            elif data.pattern_selection=="PATTERNNAME":
-#                origin=patternOwnPattern(inner_count,outer_count)
-                                       
-            origins.append(origin)
-            
-            drawings_counter=drawings_counter+1
-            inner_counter=inner_counter+1
-            inner_count=inner_count+inner.step
-            
-        outer_counter=outer_counter+1
-        outer_count=outer_count+outer.step
-
-    z_max=listMax(origins,3)
-    z_min=listMin(origins,3)
-    if abs(z_max)>abs(z_min):
-        z_abs=abs(z_max)
+    if scene.add_objects or scene.use_instances:
+        objects_limit=None
+# New objects are added for the full chain only.
+        if scene.add_objects:
+            stride=1
     else:
-        z_abs=abs(z_min)
-
-    drawings_counter=1
-    outer_counter=0
-    outer_count=outer.min
-    while outer_count<outer.max:
-        if not scene.add_objects:
-            if objects_available<(drawings_counter-1+inner.loops):
-                break
-        inner_counter=0
-        inner_count=inner.min
-        while inner_count<inner.max:
-
+        objects_limit=objects_available
+
+    state=chainState(objects_limit,stride)
+
+    stage_timer.count("elements",len(state))
+    if scene.use_instances:
+        with stage_timer.stage("write"):
+            drawInstances(data.material,state)
+        drawings_counter=drawings_counter+len(state)
+    elif scene.add_objects and data.bulk_add:
+        with stage_timer.stage("write"):
+            addObjectsBulk(data.material,state)
+        drawings_counter=drawings_counter+len(state)
+    elif scene.add_objects:
+        rotations=[(0.0,0.0,0.0)]*len(state)
+        if state.rotations is not None:
+            rotations=state.rotations.tolist()
+        scales=[(1.0,1.0,1.0)]*len(state)
+        if state.scales is not None:
+            scales=state.scales.tolist()
+        for origin,color,rotation,scale in zip(state.origins.tolist(),\
+                                    state.colors.tolist(),rotations,scales):
             object_name_numbered=leadingZerosText(data.digits,\
                                 data.object_name,drawings_counter)           
-            
-            origin=origins[drawings_counter-1]
-            x=origin[0]
-            y=origin[1]
-            z=origin[2]
-
-# Check if z_abs is zero to avoid divison by zero
-            if not z_abs==0:
-                color=rainbow_color.eval(int(z/z_abs*drawings_max))
-            else:
-                color=rainbow_color.eval(0)
-                        
-            if bpy.context.scene.add_objects:
-                addObjectsAndAppendMaterial(data.material,origin,\
-                                        color,object_name_numbered)
-            else:
-                bpy.data.objects[object_name_numbered].location.x = x
-                bpy.data.objects[object_name_numbered].location.y = y
-                bpy.data.objects[object_name_numbered].location.z = z
-                bpy.data.objects[object_name_numbered].luxcore.id = color
-
+            addObjectsAndAppendMaterial(data.material,tuple(origin),\
+                                    color,object_name_numbered,\
+                                    tuple(rotation),tuple(scale))
             drawings_counter=drawings_counter+1
-            inner_counter=inner_counter+1
-            inner_count=inner_count+inner.step
             reportProgress(drawings_counter-1,print_after_drawings)
-            
-        outer_counter=outer_counter+1
-        outer_count=outer_count+outer.step       
+    else:
+# Objects of changed elements are looked up once, then all locations and IDs
+# are applied in bulk. A rebuilt index, e.g. after a rename, writes all.
+        with stage_timer.stage("compare"):
+            generation=chain_index.generation
+            changed=changedElements(state)
+        with stage_timer.stage("lookup"):
+            handles=chain_index.lookup(state.handles[changed].tolist())
+            if chain_index.generation!=generation:
+                changed=list(range(len(state)))
+                handles=chain_index.lookup(state.handles.tolist())
+                data.elements_old=(chain_index.generation,state)
+        stage_timer.count("written",len(changed))
+        with stage_timer.stage("write"):
+            applyOrigins(handles,state.subset(changed))
+            level_of_detail.park(stride,state)
+        drawings_counter=drawings_counter+len(state)
         
 # All objects added set flag to False
     scene.add_objects=False
-    data.handler_called=False
             
 # update scene due to new position of the objects
-    bpy.context.scene.update()
+    with stage_timer.stage("scene update"):
+        bpy.context.scene.update()
+    stage_timer.disable()
     data.drawing_ongoing=False
     reportProgress(drawings_counter-1,print_after_drawings)
     print_counter=0
-    storeOldValues()
+    level_of_detail.measure(len(state),time.perf_counter()-time_start)
+# A preview is replaced by the full chain on the next frame change.
+    if stride==1:
+        data.fingerprint_old=parameterFingerprint()
+    else:
+        data.fingerprint_old=None
 
 
 # Append a property of different types to bpy.types.Scene 
@@ -784,82 +1152,228 @@ def appendPropertiesToSceneContext():
     bpy.types.Scene.log_text=bpy.props.StringProperty(name="Log",\
         default="")
 
-# bpy.props.EnumProperty requires a list of items, see data.patterns.
+# bpy.props.EnumProperty requires a list of items, see patternEnumItems().
 # Property can be showed with row.prop_menu_enum(), see LayoutPanel.
+# Enums with items function have no default, first item is default.
     bpy.types.Scene.select_pattern = bpy.props.EnumProperty(name='Select Pattern',\
-        items=data.patterns,\
+        items=patternEnumItems,\
         description="Select Pattern. Each pattern sets\
 position of the cubes differently, just try them :-).",\
-        default="CLOUD",\
         update=patternInitAndDraw)
 
+    bpy.types.Scene.custom_x = bpy.props.StringProperty(name="x",\
+        description="Expression of x of pattern Custom Expression. Use \
+inner_ and outer_ count, value, angle, loops, step, freq, radius, offset, \
+pi, e and functions like sin, cos, exp, sqrt.",\
+        default=default_expressions[0],\
+        update=expressionsChanged)
+
+    bpy.types.Scene.custom_y = bpy.props.StringProperty(name="y",\
+        description="Expression of y of pattern Custom Expression.",\
+        default=default_expressions[1],\
+        update=expressionsChanged)
+
+    bpy.types.Scene.custom_z = bpy.props.StringProperty(name="z",\
+        description="Expression of z of pattern Custom Expression.",\
+        default=default_expressions[2],\
+        update=expressionsChanged)
+
     bpy.types.Scene.inner_loops = bpy.props.IntProperty(name="Inner",\
         description="First of two loops. Range 1 to Inner: with \
 adjustable step width.",\
         default=outer.loops_default,\
         min=1, max=128,\
         soft_min=1,soft_max=128,\
-        update=drawObjects)
+        update=scheduleRedraw)
     bpy.types.Scene.outer_loops = bpy.props.IntProperty(name="Outer",\
         description="Second of two loops. Range 1 to Outer: with \
 adjustable step width.",\
         default=inner.loops_default,\
         min=1, max=128,\
         soft_min=1, soft_max=128,\
-        update=drawObjects)
+        update=scheduleRedraw)
 
     bpy.types.Scene.inner_step = bpy.props.FloatProperty(name="Inner",\
         description="Step width of Inner loop. Step is an integer number.",\
         default=inner.step_default,\
         min=0.01, max=int(inner.loops),\
         soft_min=0.01, soft_max=int(inner.loops),\
-        step=1, precision=2, update=drawObjects)             
+        step=1, precision=2, update=scheduleRedraw)             
     bpy.types.Scene.outer_step = bpy.props.FloatProperty(name="Outer",\
         description="Step width of Outer loop. Step is an integer number.",\
         default=outer.step_default,\
         min=0.01, max=int(outer.loops),\
         soft_min=0.01, soft_max=int(outer.loops),\
-        step=1, precision=2, update=drawObjects)
+        step=1, precision=2, update=scheduleRedraw)
 
     bpy.types.Scene.inner_freq = bpy.props.FloatProperty(name="Inner",\
         description="Change frequency of inner function: f(n)=fn(freq*n+offset)*radius.",\
         default=inner.freq_default,\
         min=-1000, max=1000,\
         soft_min=-1000, soft_max=1000,\
-        step=3, precision=2, update=drawObjects)
+        step=3, precision=2, update=scheduleRedraw)
     bpy.types.Scene.outer_freq = bpy.props.FloatProperty(name="Outer",\
         description="Change frequency of outer function: f(n)=fn(freq*n+offset)*radius.",\
         default=outer.freq_default,\
         min=-1000, max=1000,\
         soft_min=-1000, soft_max=1000,\
-        step=3, precision=2, update=drawObjects)
+        step=3, precision=2, update=scheduleRedraw)
 
     bpy.types.Scene.inner_radius = bpy.props.FloatProperty(name="Inner",\
         description="Change radius of inner function: f(n)=fn(freq*n+offset)*radius.",\
         default=inner.radius_default,\
         min=0.1, max=100,\
         soft_min=0.1, soft_max=100,\
-        step=3, precision=1, update=drawObjects)        
+        step=3, precision=1, update=scheduleRedraw)        
     bpy.types.Scene.outer_radius = bpy.props.FloatProperty(name="Outer",\
         description="Change radius of outer function: f(n)=fn(freq*n+offset)*radius.",\
         default=outer.radius_default,\
         min=0.1, max=100,\
         soft_min=0.1, soft_max=100,\
-        step=3, precision=2, update=drawObjects)
+        step=3, precision=2, update=scheduleRedraw)
 
     bpy.types.Scene.inner_offset = bpy.props.FloatProperty(name="Inner",\
         description="Change offset of inner function: f(n)=fn(freq*n+offset)*radius.",\
         default=inner.offset,\
         min=-100, max=100,\
         soft_min=-100, soft_max=100,\
-        step=3, precision=2, update=drawObjects)        
+        step=3, precision=2, update=scheduleRedraw)        
     bpy.types.Scene.outer_offset= bpy.props.FloatProperty(name="Outer",\
         description="Change offset of outer function: f(n)=fn(freq*n+offset)*radius.",\
         default=outer.offset,\
         min=-100, max=100,\
         soft_min=-100, soft_max=100,\
-        step=3, precision=2, update=drawObjects)
+        step=3, precision=2, update=scheduleRedraw)
         
+    bpy.types.Scene.palette = bpy.props.EnumProperty(name='Palette',\
+        items=[("RAINBOW","Rainbow","Rainbow of red, yellow, green, cyan, \
+blue and magenta",1),
+            ("GRADIENT","Gradient","Gradient from first stop at the smallest to \
+last stop at the largest value",2),
+            ("CYCLIC","Cyclic","Gradient through all stops back to first stop",3)],\
+        description="Colors of the objects depending on their z position.",\
+        default="RAINBOW",\
+        update=scheduleRedraw)
+
+    bpy.types.Scene.palette_stops = bpy.props.StringProperty(name="Stops",\
+        description="Colors of Gradient and Cyclic palette, e.g. \
+#0000ff,#00ff00,#ff0000.",\
+        default=DEFAULT_STOPS,\
+        update=scheduleRedraw)
+
+    bpy.types.Scene.color_channel = bpy.props.EnumProperty(name='Channel',\
+        items=[("Z","Z","Color depends on z position",1),
+            ("RADIUS","Radius","Color depends on distance from z axis",2),
+            ("DISTANCE","Distance","Color depends on distance from center",3)],\
+        description="Value of the objects' position colors depend on.",\
+        default="Z",\
+        update=scheduleRedraw)
+
+    bpy.types.Scene.rotation_mode = bpy.props.EnumProperty(name='Rotation',\
+        items=[("RANDOM","Random","Random rotation per object, equal for \
+equal seed",1),
+            ("PATTERN","Pattern","Rotation of the pattern, e.g. along the \
+curve tangent or the surface normal",2),
+            ("KEEP","Keep","Rotations are not changed",3)],\
+        description="Rotation of the objects.",\
+        default="KEEP",\
+        update=scheduleRedraw)
+
+    bpy.types.Scene.jitter_seed = bpy.props.IntProperty(name="Seed",\
+        description="Seed of random rotations and jitter, equal seeds \
+render equal chains on every machine.",\
+        default=0,\
+        update=scheduleRedraw)
+
+    bpy.types.Scene.rotation_jitter = bpy.props.FloatProperty(\
+        name="Rotation Jitter",\
+        description="Random rotation added per axis up to this angle in \
+radians.",\
+        default=0.0, min=0.0, max=math.pi,\
+        step=1, precision=3, update=scheduleRedraw)
+
+    bpy.types.Scene.scale_jitter = bpy.props.FloatProperty(\
+        name="Scale Jitter",\
+        description="Random uniform scale of each object, 1 plus or minus \
+up to this value.",\
+        default=0.0, min=0.0, max=0.99,\
+        step=1, precision=3, update=scheduleRedraw)
+
+    bpy.types.Scene.redraw_interval = bpy.props.FloatProperty(name="Delay",\
+        description="Seconds without further change before the array is \
+redrawn. Changes in between are dropped. 0 redraws on each change.",\
+        default=0.1,\
+        min=0, max=2,\
+        soft_min=0, soft_max=2,\
+        step=1, precision=2)
+
+    bpy.types.Scene.timing_file = bpy.props.StringProperty(name="Timing File",\
+        description="File of Export Timing, .json for JSON otherwise CSV. \
+A cProfile capture is written next to it with suffix .prof.",\
+        default="//rainbow_chain_timing.csv",\
+        subtype='FILE_PATH')
+
+    bpy.types.Scene.use_cprofile = bpy.props.BoolProperty(name="cProfile",\
+        description="Capture redraws with cProfile, see Export Timing.",\
+        default=False)
+
+    bpy.types.Scene.use_preview = bpy.props.BoolProperty(name="Preview",\
+        description="Draw a subsampled chain while parameters change, the \
+full chain once changes settle.",\
+        default=False)
+
+    bpy.types.Scene.preview_budget = bpy.props.FloatProperty(name="Budget ms",\
+        description="Time in milliseconds a preview may take. Every n-th \
+row and column is drawn to meet it.",\
+        default=30,\
+        min=1, max=1000,\
+        soft_min=5, soft_max=200,\
+        step=100, precision=0)
+
+    bpy.types.Scene.use_progressive = bpy.props.BoolProperty(\
+        name="Progressive",\
+        description="Draw changes in chunks, elements near the center first. \
+Esc cancels drawing.",\
+        default=False)
+
+    bpy.types.Scene.redraw_chunk = bpy.props.IntProperty(name="Chunk",\
+        description="Number of objects drawn per step of a progressive redraw.",\
+        default=1024,\
+        min=1, max=65536,\
+        soft_min=64, soft_max=16384)
+
+    bpy.types.Scene.cache_budget = bpy.props.IntProperty(name="Cache MB",\
+        description="Memory budget in megabytes of computed frames kept for \
+playback. Least recently used frames are dropped first. 0 disables cache.",\
+        default=64,\
+        min=0, max=4096,\
+        soft_min=0, soft_max=1024)
+
+    bpy.types.Scene.bake_file = bpy.props.StringProperty(name="Bake File",\
+        description="File of baked chain frames, see Bake Chain.",\
+        default="//rainbow_chain.bake",\
+        subtype='FILE_PATH')
+
+    bpy.types.Scene.export_file = bpy.props.StringProperty(name="Export File",\
+        description="LuxCore scene *.scn or point list *.ply of the chain, \
+see Export Chain.",\
+        default="//rainbow_chain.scn",\
+        subtype='FILE_PATH')
+
+    bpy.types.Scene.bake_processes = bpy.props.IntProperty(name="Processes",\
+        description="Number of processes calculating frames of Bake Chain. \
+0 uses all CPU cores.",\
+        default=0,\
+        min=0, max=256,\
+        soft_min=0, soft_max=64)
+
+    bpy.types.Scene.use_bake = bpy.props.BoolProperty(name=\
+        'Use bake.',\
+        description="Use baked frames, default is not checked. Frames of the \
+bake file are read instead of calculated, other frames are calculated.",\
+        default=False,\
+        update=scheduleRedraw) 
+
     bpy.types.Scene.add_objects = bpy.props.BoolProperty(name=\
         'Add objects.',\
         description="Add Objects, default is not checked. Adds objects product of both \
@@ -875,6 +1389,14 @@ both loops times if both boxes are checked any of the parameters has \
 been changed or re-entered.)",\
         default=False) 
 
+    bpy.types.Scene.use_instances = bpy.props.BoolProperty(name=\
+        'Instances.',\
+        description="Draw instances, default is not checked. Draws the chain \
+as one point cloud object instancing a cube or, if Add objects and Use active \
+are checked, a copy of the active object. Colors are stored per point.",\
+        default=False,\
+        update=scheduleRedraw) 
+
 
 def updateValues():
 # store values for comparison if update is required
@@ -888,33 +1410,127 @@ def updateValues():
 # use_active makes sense only in combination with true add_object
     if not scene.add_objects:
         scene.use_active=False
+    updateExpressions()
+    setFrame(scene.frame_current)
+
+
+# Set expressions of pattern CUSTOM, invalid expressions are reported and
+# the expressions set before are kept. Return False if invalid.
+def updateExpressions():
+    scene=bpy.context.scene
+    try:
+        setCustomExpressions(scene.custom_x,scene.custom_y,scene.custom_z)
+    except ValueError as error:
+        messageLog("Expressions not used, "+str(error))
+        return False
+    return True
+
+
+# Method called by property key 'update=' of the expressions.
+def expressionsChanged(self, context):
+    if updateExpressions():
+        scheduler.request()
         
-def storeOldValues():
-# store values for comparison if update is required
+
+# Return selected palette as (kind,stops), see paletteTable(). Stops are
+# parsed from text '#rrggbb,#rrggbb,...', rainbow is used if text is invalid.
+def colorPalette():
     scene=bpy.context.scene
+    if scene.palette=="RAINBOW":
+        return ("RAINBOW",())
+    try:
+        stops=stopColors(scene.palette_stops)
+    except ValueError as error:
+        messageLog("Palette not used, "+str(error))
+        return ("RAINBOW",())
+    if len(stops)==0:
+        return ("RAINBOW",())
+    return (scene.palette,stops)
+
+
+# Return hashable snapshot of everything a redraw depends on: pattern, inner
+# and outer parameters, number of objects and output mode. Equal fingerprints
+# of two frames mean the chain is already drawn. Call data.update() and
+# updateValues() first.
+def parameterFingerprint():
+    scene=bpy.context.scene
+    return (data.pattern_selection,inner.parameters(),outer.parameters(),\
+            checkNumberOfObjects(),scene.use_instances,data.scale_factor,\
+            colorPalette(),scene.color_channel,customExpressions(),\
+            patternFrame(),transformSettings(),bakeFingerprint())
 
-    inner.store(inner.loops,inner.step,inner.freq,inner.radius,inner.offset)
-    outer.store(outer.loops,outer.step,outer.freq,outer.radius,outer.offset)
-    data.store(data.frame_current,data.pattern_selection)
 
-def checkChangedValues():
+# Return (use_bake,bake path,frame) if the current frame is read from the
+# bake file, else None. Baked frames differ even if parameters are not keyed.
+def bakeFingerprint():
+    scene=bpy.context.scene
+    if bakedFrame(scene.frame_current) is None:
+        return None
+    return (scene.use_bake,bpy.path.abspath(scene.bake_file),\
+            scene.frame_current)
 
-    flag1=inner.checkChangedProps()
-    flag2=outer.checkChangedProps() 
-    flag3=data.checkChangedProps()
-    
-    return True and flag1 and flag2 and \
-                    flag3 
- 
-   
-def addObjectsAndAppendMaterial(material,origin,color,name_numbered):
-# Calculate a random x,y,z rotation point and apply it to a new cube object.
-    r1=random.random()
-    r2=random.random()
-    r3=random.random()
-    
+
+# Return (rotation_mode,seed,rotation_jitter,scale_jitter) of the scene.
+def transformSettings():
+    scene=bpy.context.scene
+    return (scene.rotation_mode,scene.jitter_seed,scene.rotation_jitter,\
+            scene.scale_jitter)
+
+
+# Return frame for patterns whose origins depend on the frame, e.g. FLOCK,
+# else None. Part of fingerprint and cache key, thus such patterns are
+# redrawn on every frame change.
+def patternFrame():
+    if patternOf(data.pattern_selection).stateful:
+        return bpy.context.scene.frame_current
+    return None
+
+
+# Return indices of elements whose origin, rotation, scale or color has
+# changed since the last redraw. All indices are returned if incremental
+# redraw is off or the chain's objects have changed in between.
+def changedElements(state):
+    old=data.elements_old
+    if data.incremental and old is not None and\
+            old[0]==chain_index.generation and len(old[1])==len(state):
+        old=old[1]
+        changed=(np.abs(state.origins-old.origins)>data.tolerance).any(axis=1)
+        changed=changed|(state.colors!=old.colors)
+        for values,values_old in ((state.rotations,old.rotations),\
+                                    (state.scales,old.scales)):
+            if values is not None and values_old is not None:
+                changed=changed|\
+                    (np.abs(values-values_old)>data.tolerance).any(axis=1)
+            elif values is not None:
+                changed[:]=True
+        changed=np.flatnonzero(changed)
+    else:
+        changed=np.arange(len(state))
+    data.elements_old=(chain_index.generation,state)
+    return changed.tolist()
+
+
+# Write locations, rotations, scales and LuxCore IDs of state to objects.
+# handles and state must have same order, see chainObjects(). One attribute
+# write per object and property instead of a name lookup per axis.
+def applyOrigins(handles,state):
+    for handle,origin,color in zip(handles,state.origins.tolist(),\
+                                    state.colors.tolist()):
+        handle.location=origin
+        handle.luxcore.id=color
+    if state.rotations is not None:
+        for handle,rotation in zip(handles,state.rotations.tolist()):
+            handle.rotation_euler=rotation
+    if state.scales is not None:
+        for handle,scale in zip(handles,state.scales.tolist()):
+            handle.scale=scale
+
+
+def addObjectsAndAppendMaterial(material,origin,color,name_numbered,\
+                rotation=(0.0,0.0,0.0),scale=(1.0,1.0,1.0)):
+# Apply x,y,z rotation and scale of the element, see chainTransforms(), to a
+# new cube object.
     def addPrimitive():
-        rotation=(r1,r2,r3)
         bpy.ops.mesh.primitive_cube_add(location=origin,\
                 rotation=rotation,radius=data.scale_factor)
         return bpy.context.active_object
@@ -931,15 +1547,12 @@ def addObjectsAndAppendMaterial(material,origin,color,name_numbered):
             object=active_object.copy()
             object.data=active_object.data.copy()
             object.animation_data_clear()
-            object.scale.x=data.scale_factor
-            object.scale.y=data.scale_factor
-            object.scale.z=data.scale_factor
-            object.rotation_euler.x=r1
-            object.rotation_euler.y=r2
-            object.rotation_euler.z=r3
+            scaleMesh(object.data,data.scale_factor)
+            object.rotation_euler=rotation
             scene.objects.link(object)
     else:
         object=addPrimitive()
+    object.scale=scale
 
 # Set LuxCoreRender object ID with 3 Byte color value of use with material node.
     object.luxcore.id=color
@@ -948,42 +1561,279 @@ def addObjectsAndAppendMaterial(material,origin,color,name_numbered):
     object.data.name = name_numbered
 # Append specific material to cube.
     object.data.materials.append(material)
+    chain_index.add(object)
 
 
-def setPropertiesUI():
-# store values for comparison if update is required
+# Return a new cube mesh like bpy.ops.mesh.primitive_cube_add(radius=radius).
+def cubeMesh(name,radius):
+    verts=[(x*radius,y*radius,z*radius) for x in (-1,1) for y in (-1,1)\
+                for z in (-1,1)]
+    faces=[(0,1,3,2),(4,6,7,5),(0,4,5,1),(2,3,7,6),(0,2,6,4),(1,5,7,3)]
+    mesh=bpy.data.meshes.new(name)
+    mesh.from_pydata(verts,[],faces)
+    mesh.update()
+    return mesh
+
+
+# Scale vertices of mesh by factor. Objects of the chain keep scale 1, thus
+# the scale channel of ChainState is the same for cubes and copies.
+def scaleMesh(mesh,factor):
+    coordinates=np.empty(len(mesh.vertices)*3,dtype=np.float32)
+    mesh.vertices.foreach_get("co",coordinates)
+    mesh.vertices.foreach_set("co",coordinates*factor)
+    mesh.update()
+
+
+# Return (mesh,active_object) new objects are made of, a cube or a copy of
+# the active object's data. active_object is None for cubes.
+def objectSource(material):
     scene=bpy.context.scene
-    inner.radius_old=scene.inner_radius
-    outer.radius_old=scene.outer_radius
-    inner.step_old=scene.inner_step
-    outer.step_old=scene.outer_step
-    inner.freq_old=scene.inner_freq
-    outer.freq_old=scene.outer_freq
-    inner.frame_current_old=scene.frame_current
+    active_object=bpy.context.active_object
+    if scene.use_active and active_object is not None:
+# Sets property back to false after use.
+        scene.use_active=False
+        mesh=active_object.data.copy()
+        mesh.name=data.object_name
+        scaleMesh(mesh,data.scale_factor)
+    else:
+        active_object=None
+        mesh=cubeMesh(data.object_name,data.scale_factor)
+# Append specific material to shared mesh.
+    mesh.materials.append(material)
+    return (mesh,active_object)
+
+
+# Add one object per origin without operator calls. All objects share one
+# mesh of source, see objectSource(), and the material is appended once to
+# that mesh. Objects are named by the handles of state and are linked to
+# the scene in one pass, the scene is updated once by drawObjects().
+def addObjectsBulk(material,state,source=None):
+    scene=bpy.context.scene
+    if source is None:
+        source=objectSource(material)
+    mesh,active_object=source
+
+    with stage_timer.stage("names"):
+        names=[leadingZerosText(data.digits,data.object_name,number)\
+                for number in state.handles.tolist()]
+
+    objects=[]
+    for name_numbered,origin,color in zip(names,\
+                        state.origins.tolist(),state.colors.tolist()):
+        if active_object is None:
+            object=bpy.data.objects.new(name_numbered,mesh)
+        else:
+            object=active_object.copy()
+            object.data=mesh
+            object.animation_data_clear()
+            object.name=name_numbered
+            object.scale=(1.0,1.0,1.0)
+        object.location=origin
+# Set LuxCoreRender object ID with 3 Byte color value of use with material node.
+        object.luxcore.id=color
+        objects.append(object)
+    if state.rotations is not None or state.scales is not None:
+        applyOrigins(objects,state)
+
+    for object in objects:
+        scene.objects.link(object)
+        chain_index.add(object)
+
+
+# Return value of a scene property at frame. Keyed properties are evaluated
+# from their animation curve without changing the current frame.
+def keyedValue(name,frame):
+    scene=bpy.context.scene
+    animation=scene.animation_data
+    if animation is not None and animation.action is not None:
+        fcurve=animation.action.fcurves.find(name)
+        if fcurve is not None:
+            return fcurve.evaluate(frame)
+    return getattr(scene,name)
+
+
+# Set inner and outer loop to the keyed parameters of frame.
+def updateValuesAtFrame(frame):
+    values=[]
+    for loop in ("inner","outer"):
+        values.append((int(round(keyedValue(loop+"_loops",frame))),\
+            keyedValue(loop+"_step",frame),keyedValue(loop+"_freq",frame),\
+            keyedValue(loop+"_radius",frame),keyedValue(loop+"_offset",frame)))
+    inner.update(*values[0])
+    outer.update(*values[1])
+
+
+# Calculate all frames from frame_start to frame_end and write them to a
+# bake file, see rainbowchain/bake.py. Keyed parameters are evaluated here,
+# patterns are calculated by scene.bake_processes worker processes.
+def bakeChain(path,frame_start,frame_end):
+    scene=bpy.context.scene
+    data.update()
+    frames=[]
+    for frame in range(frame_start,frame_end+1):
+        updateValuesAtFrame(frame)
+        frames.append((inner.parameters(),outer.parameters()))
+# Restore parameters of current frame.
+    updateValues()
+
+    processes=scene.bake_processes
+    if processes==0:
+        processes=os.cpu_count() or 1
+# Workers must run Blender's Python interpreter, not Blender itself.
+    context=multiprocessing.get_context("spawn")
+    if hasattr(bpy.app,"binary_path_python"):
+        context.set_executable(bpy.app.binary_path_python)
+
+    def progress(done,total):
+        messageLog("Baked "+str(done)+" of "+str(total)+" frames")
+    bakeFrames(path,data.pattern_selection,data.scale_factor,frame_start,\
+        frames,processes,context,progress,colorPalette(),scene.color_channel,\
+        customExpressions())
+
+
+# Export chain of current frame to path, see rainbowchain/export.py. The
+# chain is calculated and written chunk by chunk, no objects are added.
+def exportChainFile(path):
+    scene=bpy.context.scene
+    data.update()
+    updateValues()
+    parameters=chain.ChainParameters(data.pattern_selection,inner,outer,\
+        data.scale_factor,colorPalette(),scene.color_channel)
+
+    def progress(done,total):
+        messageLog("Exported "+str(done)+" of "+str(total)+" elements")
+    exportChain(path,parameters,transformSettings(),progress=progress,\
+        material=data.material_name)
+
+
+# Return baked (origins,colors) arrays of frame or None if bake is not used.
+def bakedFrame(frame):
+    scene=bpy.context.scene
+    if not scene.use_bake:
+        return None
+    path=bpy.path.abspath(scene.bake_file)
+    try:
+        point_cache.open(path)
+    except (OSError,ValueError) as error:
+        messageLog("Bake not used, "+str(error))
+        return None
+    return point_cache.frame(frame)
+
+
+# Instanced output. Origins are the vertices of one point cloud mesh named
+# '<object_name>.Instances'. Its object instances the source object
+# '<object_name>.Instance' at each vertex (dupli_type 'VERTS'), thus object
+# count is constant for any chain size. Rainbow colors are stored per vertex
+# in the integer layer 'luxcore_id' instead of luxcore.id of each object.
+def drawInstances(material,state):
+    scene=bpy.context.scene
+    name=data.object_name+".Instances"
+    cloud=bpy.data.objects.get(name)
+    if cloud is None:
+        cloud=bpy.data.objects.new(name,bpy.data.meshes.new(name))
+        scene.objects.link(cloud)
+        cloud.dupli_type='VERTS'
+
+# Meshes can not remove vertices, a new mesh replaces a mesh of other size.
+    mesh=cloud.data
+    if len(mesh.vertices)!=len(state):
+        cloud.data=bpy.data.meshes.new(name)
+        if mesh.users==0:
+            bpy.data.meshes.remove(mesh)
+        mesh=cloud.data
+        mesh.vertices.add(len(state))
+    mesh.vertices.foreach_set("co",state.origins.ravel())
+
+    layer=mesh.vertex_layers_int.get("luxcore_id")
+    if layer is None:
+        layer=mesh.vertex_layers_int.new(name="luxcore_id")
+    layer.data.foreach_set("value",state.colors.view(np.int32))
+    mesh.update()
+
+    source=bpy.data.objects.get(data.object_name+".Instance")
+    if source is None or scene.add_objects:
+        source=addInstanceSource(material,source)
+    source.parent=cloud
+
+
+# Add or replace the object instanced by drawInstances(). Source is a cube
+# or, if use_active is checked, a copy of the active object.
+def addInstanceSource(material,source_old):
+    scene=bpy.context.scene
+    name=data.object_name+".Instance"
+    if source_old is not None:
+        scene.objects.unlink(source_old)
+        bpy.data.objects.remove(source_old)
+
+    active_object=bpy.context.active_object
+    if scene.use_active and active_object is not None:
+# Sets property back to false after use.
+        scene.use_active=False
+        source=active_object.copy()
+        source.data=active_object.data.copy()
+        source.animation_data_clear()
+        source.name=name
+        source.scale=(data.scale_factor,)*3
+    else:
+        source=bpy.data.objects.new(name,cubeMesh(name,data.scale_factor))
+    source.data.name=name
+    source.location=(0,0,0)
+    source.data.materials.append(material)
+    scene.objects.link(source)
+    return source
 
 
 def register():
     bpy.utils.register_class(DrawObjects)
     bpy.utils.register_class(LayoutPanel)
     bpy.utils.register_class(AddObjects)
+    bpy.utils.register_class(DrawProgressive)
+    bpy.utils.register_class(BakeChain)
+    bpy.utils.register_class(ExportChain)
+    bpy.utils.register_class(ExportTiming)
+    bpy.utils.register_class(ResetTiming)
+    bpy.utils.register_class(TimingPanel)
 # Define UI properties in bpy.types.Scene. To get/set their value use
 # bpy.context.scene.
     appendPropertiesToSceneContext()
     print("class registered")
 # Append method to blender event handler'frame:change_post'.
     bpy.app.handlers.frame_change_post.append(post_handler)
+# Append methods keeping chain_index valid.
+    bpy.app.handlers.scene_update_post.append(index_handler)
+    bpy.app.handlers.scene_update_post.append(settle_handler)
+    bpy.app.handlers.undo_post.append(index_reset_handler)
+    bpy.app.handlers.redo_post.append(index_reset_handler)
+    bpy.app.handlers.load_post.append(index_reset_handler)
 
 
 def unregister():
+    scheduler.cancel()
+    progressive.cancel()
     bpy.utils.unregister_class(DrawObjects)
     bpy.utils.unregister_class(LayoutPanel)
     bpy.utils.unregister_class(AddObjects)
+    bpy.utils.unregister_class(DrawProgressive)
+    bpy.utils.unregister_class(BakeChain)
+    bpy.utils.unregister_class(ExportChain)
+    bpy.utils.unregister_class(ExportTiming)
+    bpy.utils.unregister_class(ResetTiming)
+    bpy.utils.unregister_class(TimingPanel)
+    point_cache.close()
 # Remove method from blender event handler'frame:change_post'.
     bpy.app.handlers.frame_change_post.remove(post_handler)
+    bpy.app.handlers.scene_update_post.remove(index_handler)
+    bpy.app.handlers.scene_update_post.remove(settle_handler)
+    bpy.app.handlers.undo_post.remove(index_reset_handler)
+    bpy.app.handlers.redo_post.remove(index_reset_handler)
+    bpy.app.handlers.load_post.remove(index_reset_handler)
     
     Scene=bpy.types.Scene
     bpy.props.RemoveProperty(Scene,attr='log_text')
     bpy.props.RemoveProperty(Scene,attr='select_pattern')
+    bpy.props.RemoveProperty(Scene,attr='custom_x')
+    bpy.props.RemoveProperty(Scene,attr='custom_y')
+    bpy.props.RemoveProperty(Scene,attr='custom_z')
     bpy.props.RemoveProperty(Scene,attr='inner_step')
     bpy.props.RemoveProperty(Scene,attr='inner_freq')
     bpy.props.RemoveProperty(Scene,attr='inner_radius')
@@ -994,6 +1844,26 @@ def unregister():
     bpy.props.RemoveProperty(Scene,attr='outer_offset')
     bpy.props.RemoveProperty(Scene,attr='add_objects')
     bpy.props.RemoveProperty(Scene,attr='use_active')
+    bpy.props.RemoveProperty(Scene,attr='use_instances')
+    bpy.props.RemoveProperty(Scene,attr='redraw_interval')
+    bpy.props.RemoveProperty(Scene,attr='use_progressive')
+    bpy.props.RemoveProperty(Scene,attr='use_preview')
+    bpy.props.RemoveProperty(Scene,attr='timing_file')
+    bpy.props.RemoveProperty(Scene,attr='use_cprofile')
+    bpy.props.RemoveProperty(Scene,attr='preview_budget')
+    bpy.props.RemoveProperty(Scene,attr='redraw_chunk')
+    bpy.props.RemoveProperty(Scene,attr='palette')
+    bpy.props.RemoveProperty(Scene,attr='palette_stops')
+    bpy.props.RemoveProperty(Scene,attr='color_channel')
+    bpy.props.RemoveProperty(Scene,attr='rotation_mode')
+    bpy.props.RemoveProperty(Scene,attr='jitter_seed')
+    bpy.props.RemoveProperty(Scene,attr='rotation_jitter')
+    bpy.props.RemoveProperty(Scene,attr='scale_jitter')
+    bpy.props.RemoveProperty(Scene,attr='cache_budget')
+    bpy.props.RemoveProperty(Scene,attr='bake_file')
+    bpy.props.RemoveProperty(Scene,attr='export_file')
+    bpy.props.RemoveProperty(Scene,attr='use_bake')
+    bpy.props.RemoveProperty(Scene,attr='bake_processes')
 
 
 # Following lines are required to to run the script from text editor 
@@ -1005,18 +1875,32 @@ if __name__ == "__main__":
 # Instantiate data object for 'global variables'.
 data=DataContainer()
 
-# Use: colors=Colors(); color=colors.Rgb(red,green,blue)
-color = RgbColor()
+# Baked frames, see bakeChain() and bakedFrame().
+point_cache=PointCache()
+
+# Computed origins and colors of recent frames, see drawObjects().
+origin_cache=OriginCache()
+
+# Coalesces redraws of property updates, see scheduleRedraw().
+scheduler=RedrawScheduler()
+
+# Times of redraw stages, see TimingPanel.
+stage_timer=StageTimer()
+
+# Stride of preview redraws, see RedrawScheduler.preview().
+level_of_detail=LevelOfDetail()
+
+# Chunked redraw of DrawProgressive, see RedrawScheduler.flush().
+progressive=ProgressiveRedraw()
 
-# Method eval(self,value) calculates rainbow color.
-# value is integer.
-rainbow_color=RainbowColor()
+# Index of chain objects, see checkNumberOfObjects() and chainObjects().
+chain_index=ChainIndex()
 
 # Instantiate objects for inner and outer loop controlling.
 # These objects are important e.g. to act flexible on user input.
 # defaults: loops,step,freq,radius,offset
 
-parameter=data.parameters[0]
+parameter=chain.presetParameters(data.pattern_selection)
 
 inner_loops=parameter[1][1]
 inner_step=parameter[1][2]
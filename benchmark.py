@@ -0,0 +1,232 @@
+#-----------------------------------------------------------
+# benchmark.py
+#
+# Benchmarks of pattern generation, coloring, naming and object write back
+# without Blender. The add-on is imported with a stand-in of the bpy module
+# whose bpy.data.objects is a plain object store, thus chain index and
+# write back run the add-on's own code.
+# Examples:
+#   python benchmark.py
+#   python benchmark.py --sizes 10,128,512 --save baseline.json
+#   python benchmark.py --compare baseline.json --threshold 0.2
+# Each benchmark is repeated, latencies are reported as median, 90th and
+# 99th percentile and throughput as elements per second of the median.
+# --compare exits with 1 if a median is slower than baseline by more than
+# threshold.
+#------------------------------------------------------------
+
+import argparse
+import json
+import sys
+import time
+import types
+import numpy as np
+
+
+class FakeObject():
+# Object of the stand-in bpy.data.objects, attributes the add-on writes.
+    __slots__=("name","data","location","rotation_euler","scale","hide",\
+                "luxcore")
+
+    def __init__(self,name,data=None):
+        self.name=name
+        self.data=data
+        self.location=(0.0,0.0,0.0)
+        self.rotation_euler=(0.0,0.0,0.0)
+        self.scale=(1.0,1.0,1.0)
+        self.hide=False
+        self.luxcore=types.SimpleNamespace(id=0)
+
+
+class FakeObjects():
+# Object store of the stand-in bpy.data, objects by name in order of adding.
+    def __init__(self):
+        self.objects={}
+
+    def new(self,name,data=None):
+        object=FakeObject(name,data)
+        self.objects[name]=object
+        return object
+
+    def get(self,name,default=None):
+        return self.objects.get(name,default)
+
+    def clear(self):
+        self.objects.clear()
+
+    def __iter__(self):
+        return iter(list(self.objects.values()))
+
+    def __len__(self):
+        return len(self.objects)
+
+
+# Install a bpy module stand-in sufficient to import and run the add-on's
+# drawing functions. Returns the module.
+def installFakeBpy():
+    bpy=types.ModuleType("bpy")
+
+    class Base():
+        pass
+
+    def persistent(function):
+        return function
+
+    handlers=types.SimpleNamespace(persistent=persistent,\
+        frame_change_post=[],scene_update_post=[],undo_post=[],\
+        redo_post=[],load_post=[])
+    bpy.app=types.SimpleNamespace(handlers=handlers,version=(2,79,0))
+    bpy.types=types.SimpleNamespace(Operator=Base,Panel=Base,\
+        Material=Base,Scene=Base)
+    bpy.props=types.SimpleNamespace()
+    bpy.utils=types.SimpleNamespace()
+    bpy.path=types.SimpleNamespace(abspath=lambda path: path)
+    bpy.data=types.SimpleNamespace(objects=FakeObjects(),materials={},\
+        meshes={})
+    scene=types.SimpleNamespace(frame_current=1,log_text="",\
+        update=lambda: None)
+    bpy.context=types.SimpleNamespace(scene=scene,active_object=None)
+
+    sys.modules["bpy"]=bpy
+    sys.modules["bpy.app"]=bpy.app
+    sys.modules["bpy.app.handlers"]=handlers
+    return bpy
+
+
+# Return latencies in seconds of repeat calls of function.
+def measure(function,repeat):
+    latencies=[]
+    for number in range(repeat):
+        start=time.perf_counter()
+        function()
+        latencies.append(time.perf_counter()-start)
+    return np.array(latencies)
+
+
+# Return benchmarks as list of (name,size,elements,function,setup). setup
+# is called before function is measured or is None.
+def benchmarks(addon,bpy,sizes,scalar_max):
+    from rainbowchain.chain import presetParameters
+    from rainbowchain.colors import originColors, paletteTable, rainbow_color
+    from rainbowchain.loop import Loop
+    from rainbowchain.patterns import patternOriginsArray, patternOriginsScalar
+    from rainbowchain.state import ChainState
+
+    cases=[]
+    for size in sizes:
+        elements=size*size
+        for pattern in ("CLOUD","SINCOS","GAUSS","BOID"):
+            parameter=presetParameters(pattern)
+            inner=Loop(size,*parameter[1][2:],loop_range=30)
+            outer=Loop(size,*parameter[2][2:],loop_range=30)
+            cases.append(("pattern "+pattern,size,elements,\
+                lambda p=pattern,i=inner,o=outer:\
+                    patternOriginsArray(p,i,o,0.1),None))
+            if size<=scalar_max:
+                cases.append(("pattern scalar "+pattern,size,elements,\
+                    lambda p=pattern,i=inner,o=outer:\
+                        patternOriginsScalar(p,i,o,0.1),None))
+
+        parameter=presetParameters("CLOUD")
+        inner=Loop(size,*parameter[1][2:],loop_range=30)
+        outer=Loop(size,*parameter[2][2:],loop_range=30)
+        origins=patternOriginsArray("CLOUD",inner,outer,0.1)
+        values=list(range(elements))
+        table=paletteTable()
+        cases.append(("RainbowColor.eval",size,elements,\
+            lambda v=values: [rainbow_color.eval(value) for value in v],None))
+        cases.append(("originColors",size,elements,\
+            lambda o=origins,n=elements: originColors(o,n,table),None))
+        cases.append(("leadingZerosText",size,elements,\
+            lambda n=elements: [addon.leadingZerosText(addon.data.digits,\
+                addon.data.object_name,number) for number in range(1,n+1)],\
+            None))
+
+# Object store of the chain, 'Objects.0001' ... in the fake bpy.data.
+        def store(n=elements):
+            objects=bpy.data.objects
+            objects.clear()
+            objects.new(addon.data.object_name)
+            for number in range(1,n+1):
+                objects.new(addon.leadingZerosText(addon.data.digits,\
+                    addon.data.object_name,number))
+        def countCold():
+            addon.chain_index.invalidate()
+            return addon.checkNumberOfObjects()
+        cases.append(("checkNumberOfObjects cold",size,elements,countCold,\
+            store))
+        cases.append(("checkNumberOfObjects",size,elements,\
+            addon.checkNumberOfObjects,store))
+        def write(state=ChainState(origins,originColors(origins,elements,table))):
+            addon.applyOrigins(addon.chain_index.lookup(\
+                state.handles.tolist()),state)
+        cases.append(("lookup and applyOrigins",size,elements,write,store))
+    return cases
+
+
+def parseArguments(argv):
+    parser=argparse.ArgumentParser(description="Benchmark rainbow chain \
+pattern generation, coloring and write back without Blender.")
+    parser.add_argument("--sizes",default="10,32,64,128,256",\
+        help="comma separated grid sizes n of n*n elements")
+    parser.add_argument("--repeat",type=int,default=20,\
+        help="calls per benchmark")
+    parser.add_argument("--scalar-max",type=int,default=64,\
+        help="largest grid size of scalar reference patterns")
+    parser.add_argument("--filter",default="",\
+        help="run benchmarks whose name contains text only")
+    parser.add_argument("--save",help="write medians to JSON baseline file")
+    parser.add_argument("--compare",help="compare medians to JSON baseline file")
+    parser.add_argument("--threshold",type=float,default=0.2,\
+        help="allowed slow down relative to baseline, 0.2 is 20%%")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments=parseArguments(argv)
+    sizes=[int(size) for size in arguments.sizes.split(",")]
+    bpy=installFakeBpy()
+    import RainbowChainPanelAddon as addon
+
+    baseline={}
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline=json.load(file)
+
+    medians={}
+    regressions=0
+    print("%-28s %6s %9s %10s %10s %10s %12s %8s" % ("benchmark","size",\
+        "elements","median ms","p90 ms","p99 ms","elements/s","change"))
+    for name,size,elements,function,setup in benchmarks(addon,bpy,sizes,\
+                                            arguments.scalar_max):
+        if arguments.filter not in name:
+            continue
+        if setup is not None:
+            setup()
+# One call before measuring, e.g. to fill the palette table cache.
+        function()
+        latencies=measure(function,arguments.repeat)
+        median,p90,p99=np.percentile(latencies,(50,90,99))
+        key=name+"@"+str(size)
+        medians[key]=median
+        change=""
+        if key in baseline:
+            ratio=median/baseline[key]-1
+            change="%+.0f%%" % (ratio*100)
+            if ratio>arguments.threshold:
+                change=change+" SLOWER"
+                regressions=regressions+1
+        print("%-28s %6d %9d %10.3f %10.3f %10.3f %12.3g %8s" % (name,size,\
+            elements,median*1000,p90*1000,p99*1000,elements/median,change))
+
+    if arguments.save:
+        with open(arguments.save,"w") as file:
+            json.dump(medians,file,indent=2,sort_keys=True)
+    if regressions:
+        print(str(regressions)+" benchmarks slower than baseline")
+        return 1
+    return 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+#-----------------------------------------------------------
+# rainbowchain
+#
+# Core of RainbowChainPanelAddon.py without Blender. Modules only import
+# Python standard library and numpy, thus patterns can be evaluated in 
+# worker processes, e.g. by rainbowchain.bake.bakeFrames().
+#
+# Copyright (C) 2019, Michael Trösch aka Farbigewelt
+#
+# Software "RainbowChainAddon" comes with Aboslutely No Warranty, 
+# read details in "LICENSE - GPL 3.txt". 
+#
+#------------------------------------------------------------
@@ -0,0 +1,177 @@
+#-----------------------------------------------------------
+# rainbowchain/__main__.py
+#
+# Command line entry point, calculates chains without Blender.
+# Examples:
+#   python -m rainbowchain CLOUD -o cloud.npz
+#   python -m rainbowchain GAUSS --inner 30,0.5,0,30,-7.5 \
+#       --sweep inner_radius=10:40:4 --sweep outer_freq=1:2:3 -o gauss.bake
+# Output *.npz holds arrays origins_0001, colors_0001, ... and parameters,
+# one row (inner loops,step,freq,radius,offset,range, outer ...) per chain.
+# Output *.bake is a bake file with one frame per chain, frame_start 1,
+# see rainbowchain/bake.py. It can be played back by the add-on.
+# Output *.ply or *.scn is streamed chunk by chunk for LuxCore, see
+# rainbowchain/export.py. Sweeps write one file per chain, name_0001.ply ...
+#   python -m rainbowchain CLOUD --inner 1000,1,1,30,1.5 -o cloud.scn \
+#       --rotation PATTERN
+#------------------------------------------------------------
+
+import argparse
+import itertools
+import os
+import sys
+import numpy as np
+
+from rainbowchain.bake import bakeFrames
+from rainbowchain.chain import ChainParameters, patternItems
+from rainbowchain.colors import DEFAULT_STOPS, channels, stopColors
+from rainbowchain.expression import customExpressions, setCustomExpressions
+from rainbowchain.export import CHUNK_SIZE, exportChain
+from rainbowchain.loop import Loop
+from rainbowchain.transform import rotation_modes
+
+loop_names=("loops","step","freq","radius","offset")
+
+
+# Return loop parameters of text 'loops,step,freq,radius,offset[,range]'.
+def loopValues(text):
+    values=[float(value) for value in text.split(",")]
+    if len(values) not in (5,6):
+        raise argparse.ArgumentTypeError("5 or 6 comma separated values \
+expected: loops,step,freq,radius,offset[,range]")
+    values[0]=int(values[0])
+    return values
+
+
+# Return (name,values) of text 'name=start:stop:count'.
+def sweepValues(text):
+    name,_,values=text.partition("=")
+    loop,_,value=name.partition("_")
+    if loop not in ("inner","outer") or value not in loop_names:
+        raise argparse.ArgumentTypeError("Unknown parameter "+name)
+    start,stop,count=values.split(":")
+    values=np.linspace(float(start),float(stop),int(count)).tolist()
+    if value=="loops":
+        values=[int(round(value)) for value in values]
+    return (name,values)
+
+
+# Return stops of text '#rrggbb,#rrggbb,...', see stopColors().
+def paletteStops(text):
+    try:
+        return stopColors(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def parseArguments(argv):
+    parser=argparse.ArgumentParser(prog="rainbowchain",\
+        description="Calculate origins and colors of rainbow chains.")
+    parser.add_argument("pattern",choices=[item[0] for item in patternItems()])
+    parser.add_argument("--inner",type=loopValues,\
+        help="inner loop: loops,step,freq,radius,offset[,range]")
+    parser.add_argument("--outer",type=loopValues,\
+        help="outer loop: loops,step,freq,radius,offset[,range]")
+    parser.add_argument("--scale",type=float,default=0.1,\
+        help="scale factor of origins, default 0.1")
+    parser.add_argument("--sweep",type=sweepValues,action="append",default=[],\
+        help="sweep parameter, e.g. inner_radius=10:40:4, repeat for \
+all combinations")
+    parser.add_argument("--palette",default="RAINBOW",\
+        choices=("RAINBOW","GRADIENT","CYCLIC"),help="color palette")
+    parser.add_argument("--stops",type=paletteStops,default=DEFAULT_STOPS,\
+        help="stops of palettes GRADIENT and CYCLIC, default '"+\
+DEFAULT_STOPS+"'")
+    parser.add_argument("--channel",default="Z",choices=channels,\
+        help="value colors depend on, default Z")
+    parser.add_argument("--expression",nargs=3,metavar=("X","Y","Z"),\
+        help="x, y and z expressions of pattern CUSTOM, e.g. \
+'cos(inner_angle)*inner_radius' 'sin(inner_angle)*inner_radius' outer_count")
+    parser.add_argument("--processes",type=int,default=1,\
+        help="worker processes for *.bake output")
+    parser.add_argument("--rotation",choices=rotation_modes,\
+        help="rotation of *.scn objects, default none")
+    parser.add_argument("--seed",type=int,default=0,\
+        help="seed of random rotations and jitter")
+    parser.add_argument("--rotation-jitter",type=float,default=0.0,\
+        help="random rotation per axis up to radians")
+    parser.add_argument("--scale-jitter",type=float,default=0.0,\
+        help="random uniform scale 1 plus or minus up to value")
+    parser.add_argument("--chunk",type=int,default=CHUNK_SIZE,\
+        help="elements per chunk of *.ply and *.scn output")
+    parser.add_argument("-o","--output",required=True,\
+        help="output file *.npz, *.bake, *.ply or *.scn")
+    arguments=parser.parse_args(argv)
+    if arguments.palette!="RAINBOW" and len(arguments.stops)==0:
+        parser.error("palette "+arguments.palette+" requires at least one stop")
+    if arguments.expression is not None:
+        try:
+            setCustomExpressions(*arguments.expression)
+        except ValueError as error:
+            parser.error(str(error))
+    return arguments
+
+
+# Return list of ChainParameters of all sweep combinations.
+def sweepChains(arguments):
+    preset=ChainParameters.preset(arguments.pattern,arguments.scale)
+    inner=list(preset.inner.parameters())
+    outer=list(preset.outer.parameters())
+    if arguments.inner is not None:
+        inner[:len(arguments.inner)]=arguments.inner
+    if arguments.outer is not None:
+        outer[:len(arguments.outer)]=arguments.outer
+# Default range follows loops and step like a new Loop.
+    if arguments.inner is None or len(arguments.inner)==5:
+        inner=inner[:5]
+    if arguments.outer is None or len(arguments.outer)==5:
+        outer=outer[:5]
+
+    palette=(arguments.palette,arguments.stops)
+    names=[name for name,values in arguments.sweep]
+    chains=[]
+    for combination in itertools.product(*[values for name,values\
+                in arguments.sweep]):
+        loops={"inner":list(inner),"outer":list(outer)}
+        for name,value in zip(names,combination):
+            loop,_,value_name=name.partition("_")
+            loops[loop][loop_names.index(value_name)]=value
+        chains.append(ChainParameters(arguments.pattern,Loop(*loops["inner"]),\
+            Loop(*loops["outer"]),arguments.scale,palette,arguments.channel))
+    return chains
+
+
+def main(argv=None):
+    arguments=parseArguments(argv)
+    chains=sweepChains(arguments)
+    if arguments.output.endswith(".bake"):
+        frames=[(chain.inner.parameters(),chain.outer.parameters())\
+                    for chain in chains]
+        bakeFrames(arguments.output,arguments.pattern,arguments.scale,1,\
+            frames,arguments.processes,palette=chains[0].palette,\
+            channel=arguments.channel,expressions=customExpressions())
+    elif os.path.splitext(arguments.output)[1].lower() in (".ply",".scn"):
+        transforms=None
+        if arguments.rotation is not None or arguments.scale_jitter>0:
+            transforms=(arguments.rotation or "KEEP",arguments.seed,\
+                arguments.rotation_jitter,arguments.scale_jitter)
+        root,extension=os.path.splitext(arguments.output)
+        for number,chain in enumerate(chains,1):
+            path=arguments.output
+            if len(chains)>1:
+                path=root+"_%04d" % number+extension
+            exportChain(path,chain,transforms,arguments.chunk)
+    else:
+        arrays={"parameters":np.array([chain.inner.parameters()+\
+                    chain.outer.parameters() for chain in chains])}
+        for number,chain in enumerate(chains,1):
+            origins=chain.origins()
+            arrays["origins_%04d" % number]=origins.astype(np.float32)
+            arrays["colors_%04d" % number]=chain.colors(origins)
+        np.savez(arguments.output,**arrays)
+    print("Wrote",len(chains),"chains to",arguments.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#-----------------------------------------------------------
+# rainbowchain/bake.py
+#
+# Bake file of chain frames and its parallel baking. Layout, little endian:
+# header    magic 'RCBAKE01', int32 frame_start, int32 frame_count,
+#           int64 table_offset
+# frames    per frame float32 origins (count*3) and uint32 colors (count)
+# table     int64 (frame_count,2) with byte offset and count of each frame
+#
+# bakeFrames() lays out the whole file first. Workers then write their
+# frames into the memory mapped file, which is the shared buffer of all
+# processes. Workers import no Blender module.
+#------------------------------------------------------------
+
+import multiprocessing
+import struct
+import numpy as np
+
+from rainbowchain.colors import originColors, paletteTable
+from rainbowchain.expression import setCustomExpressions
+from rainbowchain.flock import setFrame
+from rainbowchain.loop import Loop
+from rainbowchain.patterns import loopCounts, patternOriginsArray
+from rainbowchain.registry import patternOf
+
+MAGIC=b"RCBAKE01"
+HEADER=struct.Struct("<8siiq")
+
+
+class PointCache():
+# Baked chain file opened for reading. The file is memory mapped, a frame
+# is read as slice without copying.
+    def __init__(self):
+        self.path=""
+        self.buffer=None
+        self.table=None
+        self.frame_start=0
+
+    def open(self,path):
+        if path==self.path and self.buffer is not None:
+            return
+        self.close()
+        buffer=np.memmap(path,dtype=np.uint8,mode='r')
+        if len(buffer)<HEADER.size:
+            raise ValueError("Not a RainbowChain bake file: "+path)
+        magic,frame_start,frame_count,table_offset=\
+            HEADER.unpack(buffer[:HEADER.size].tobytes())
+        if magic!=MAGIC:
+            raise ValueError("Not a RainbowChain bake file: "+path)
+# Frames must lie between header and table, the table at the end.
+        if frame_count<0 or table_offset<HEADER.size or\
+                table_offset+frame_count*16>len(buffer):
+            raise ValueError("Truncated bake file: "+path)
+        table=np.frombuffer(buffer,dtype="<i8",count=frame_count*2,\
+                    offset=table_offset).reshape(-1,2)
+        if ((table[:,0]<HEADER.size)|(table[:,1]<0)|\
+                (table[:,0]+table[:,1]*16>table_offset)).any():
+            raise ValueError("Damaged bake file: "+path)
+        self.table=table
+        self.buffer=buffer
+        self.frame_start=frame_start
+        self.path=path
+
+    def close(self):
+        self.path=""
+        self.buffer=None
+        self.table=None
+
+# Return (origins,colors) of frame or None if frame is not baked.
+    def frame(self,frame):
+        index=frame-self.frame_start
+        if self.buffer is None or index<0 or index>=len(self.table):
+            return None
+        offset,count=(int(value) for value in self.table[index])
+        origins=np.frombuffer(self.buffer,dtype="<f4",count=count*3,\
+                    offset=offset).reshape(-1,3)
+        colors=np.frombuffer(self.buffer,dtype="<u4",count=count,\
+                    offset=offset+count*12)
+        return (origins,colors)
+
+
+# Return number of origins of a frame without calculating the pattern.
+def frameCount(inner_parameters,outer_parameters):
+    return len(loopCounts(Loop(*inner_parameters)))*\
+            len(loopCounts(Loop(*outer_parameters)))
+
+
+# Calculate one frame and write it to its place in the bake file.
+# task: (path,pattern,module,expressions,scale_factor,palette,channel,offset,
+#        frame,inner_parameters,outer_parameters), module defines pattern,
+#        expressions are (x,y,z) of pattern CUSTOM or None.
+def bakeWorker(task):
+    path,pattern,module,expressions,scale_factor,palette,channel,offset,\
+        frame,inner_parameters,outer_parameters=task
+    patternOf(pattern,module)
+    if expressions is not None:
+        setCustomExpressions(*expressions)
+    setFrame(frame)
+    inner=Loop(*inner_parameters)
+    outer=Loop(*outer_parameters)
+    origins=patternOriginsArray(pattern,inner,outer,scale_factor)
+    colors=originColors(origins,inner.loops*outer.loops,paletteTable(*palette),\
+                channel,palette[0])
+    count=len(origins)
+    if count==0:
+        return count
+    buffer=np.memmap(path,dtype=np.uint8,mode='r+',offset=offset,\
+                shape=(count*16,))
+    buffer[:count*12]=origins.astype("<f4").reshape(-1).view(np.uint8)
+    buffer[count*12:]=colors.astype("<u4").view(np.uint8)
+    buffer.flush()
+    return count
+
+
+# Bake frames frame_start, frame_start+1, ... to path. frames is a list of
+# (inner_parameters,outer_parameters) per frame, see Loop.parameters().
+# processes>1 calculates frames in a process pool of context, default is
+# multiprocessing itself. progress(done,total) is called after each frame.
+# Stateful patterns like FLOCK are baked frame by frame in this process.
+# palette is (kind,stops), see paletteTable(), channel see channelValues().
+def bakeFrames(path,pattern,scale_factor,frame_start,frames,processes=1,\
+                context=None,progress=None,palette=("RAINBOW",()),channel="Z",\
+                expressions=None):
+    table=np.zeros((len(frames),2),dtype="<i8")
+    offset=HEADER.size
+    for index,(inner_parameters,outer_parameters) in enumerate(frames):
+        count=frameCount(inner_parameters,outer_parameters)
+        table[index]=(offset,count)
+        offset=offset+count*16
+    with open(path,'wb') as file:
+        file.write(HEADER.pack(MAGIC,frame_start,len(frames),offset))
+        file.truncate(offset)
+        file.seek(offset)
+        table.tofile(file)
+
+    if patternOf(pattern).stateful:
+        processes=1
+    module=patternOf(pattern).module()
+    tasks=[(path,pattern,module,expressions,scale_factor,palette,channel,\
+                int(table[index][0]),frame_start+index)+tuple(frame)\
+                for index,frame in enumerate(frames)]
+    if processes>1 and len(tasks)>1:
+        if context is None:
+            context=multiprocessing
+        pool=context.Pool(processes)
+        try:
+            for done,count in enumerate(pool.imap_unordered(bakeWorker,tasks),1):
+                if progress is not None:
+                    progress(done,len(tasks))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for done,task in enumerate(tasks,1):
+            bakeWorker(task)
+            if progress is not None:
+                progress(done,len(tasks))
@@ -0,0 +1,58 @@
+#-----------------------------------------------------------
+# rainbowchain/chain.py
+#
+# Pattern presets and explicit parameters of a chain. Patterns and their
+# default values are registered in rainbowchain/patterns.py, see
+# rainbowchain/registry.py.
+#------------------------------------------------------------
+
+from rainbowchain.colors import originColors, paletteTable
+from rainbowchain.loop import Loop
+from rainbowchain.patterns import patternOriginsArray, patternOriginsScalar
+from rainbowchain.registry import patternItems, patternOf
+
+
+# Return default values of pattern identifier in the following order
+# ("Name",("Inner",<Number of Loops>,<Step Width>,<Frequency>,<Radius>,<Offset>),
+#   ("Outer",...)). 'Inner' and 'Outer' are used only to improve readability.
+def presetParameters(pattern):
+    pattern=patternOf(pattern)
+    return (pattern.name,("Inner",)+pattern.inner,("Outer",)+pattern.outer)
+
+
+class ChainParameters():
+# Everything origins and colors of a chain depend on. inner and outer are
+# rainbowchain.loop.Loop objects, palette is (kind,stops), see paletteTable(),
+# colors depend on channel, see channelValues().
+    __slots__=("pattern","inner","outer","scale_factor","palette","channel")
+
+    def __init__(self,pattern,inner,outer,scale_factor=0.1,\
+                palette=("RAINBOW",()),channel="Z"):
+        self.pattern=pattern
+        self.inner=inner
+        self.outer=outer
+        self.scale_factor=scale_factor
+        self.palette=palette
+        self.channel=channel
+
+# Return chain of pattern with default values.
+    @classmethod
+    def preset(cls,pattern,scale_factor=0.1):
+        parameter=presetParameters(pattern)
+        return cls(pattern,Loop(*parameter[1][1:]),Loop(*parameter[2][1:]),\
+                    scale_factor)
+
+# Return origins as (N,3) array. Outer loops are limited to the number of
+# available objects, None means no limit.
+    def origins(self,objects_available=None,vectorized=True):
+        if vectorized:
+            method=patternOriginsArray
+        else:
+            method=patternOriginsScalar
+        return method(self.pattern,self.inner,self.outer,self.scale_factor,\
+                    objects_available)
+
+# Return colors of origins as uint32 array.
+    def colors(self,origins):
+        return originColors(origins,self.inner.loops*self.outer.loops,\
+                    paletteTable(*self.palette),self.channel,self.palette[0])
@@ -0,0 +1,203 @@
+#-----------------------------------------------------------
+# rainbowchain/colors.py
+#
+# Rainbow colors as 3 byte RGB values, e.g. for LuxCoreRender object IDs.
+# Colors are looked up in palette tables compiled once, see paletteTable().
+#------------------------------------------------------------
+
+import numpy as np
+
+# Smallest divisor of color scaling, see channelScale() and scaledColors().
+FLOAT_MIN=2**-126
+
+
+class Color:
+    def __init__(self,byte):
+        self.factor=pow(2,((byte-1)*8))
+        self.colors=[]
+        self.min=0
+        self.max=255
+        for count in range(self.min, self.max+1,1):
+            self.colors.append(count*self.factor)
+
+    def value(self,index):
+        return self.colors[index]
+
+
+# Use example of Colors
+# >>>colors=Colors()
+# >>>colors.Rgb(red,green,blue)
+# red+green*256+blue*256^2      as decimal output
+class RgbColor:
+    """Calculates 3 Byte RGB value"""
+    def __init__(self):
+        self.red=Color(1)
+        self.green=Color(2)
+        self.blue=Color(3)
+            
+    def Rgb(self,red,green,blue):
+        return self.red.value(red)+self.green.value(green)+self.blue.value(blue)
+
+
+# Method eval() calculates rainbow color depending on integer value
+class RainbowColor:
+    color=0
+    def eval(self,value):
+        max=255
+        current=value%256
+        value=value%1536
+        if value<256:
+            self.color=color.Rgb(max,current,0)
+        elif value<512:
+            self.color=color.Rgb(max-current,max,0)
+        elif value<768:
+            self.color=color.Rgb(0,max,current)
+        elif value<1024:
+            self.color=color.Rgb(0,max-current,max)
+        elif value<1280:
+            self.color=color.Rgb(current,0,max)
+        elif value<1536:
+            self.color=color.Rgb(max,0,max-current)
+
+        return self.color
+
+
+# Use: color=color.Rgb(red,green,blue)
+color=RgbColor()
+
+# Method eval(self,value) calculates rainbow color. value is integer.
+rainbow_color=RainbowColor()
+
+# Number of entries of a palette table, one full rainbow cycle.
+TABLE_SIZE=1536
+
+# Compiled palette tables by (kind,stops), see paletteTable().
+palette_tables={}
+
+# Stops of palettes GRADIENT and CYCLIC if none are given.
+DEFAULT_STOPS="#0000ff,#00ff00,#ff0000"
+
+
+# Return (red,green,blue) of text '#rrggbb' or 'rrggbb'.
+def hexColor(text):
+    text=text.strip().lstrip("#")
+    if len(text)!=6 or not all(digit in "0123456789abcdefABCDEF"\
+                                for digit in text):
+        raise ValueError("Color '#rrggbb' expected, got '"+text+"'")
+    return (int(text[0:2],16),int(text[2:4],16),int(text[4:6],16))
+
+
+# Return stops of text '#rrggbb,#rrggbb,...' as tuple of (red,green,blue).
+# Invalid colors raise ValueError, empty entries are skipped.
+def stopColors(text):
+    return tuple(hexColor(stop) for stop in text.split(",") if stop.strip())
+
+
+# Return packed RGB values red+green*256+blue*256^2 of (N,3) array.
+def packRgb(rgb):
+    rgb=np.clip(np.rint(rgb),0,255).astype(np.uint32)
+    return rgb[:,0]+(rgb[:,1]<<8)+(rgb[:,2]<<16)
+
+
+# Return table of TABLE_SIZE packed RGB values. kind is
+# 'RAINBOW'  rainbow of RainbowColor.eval(), stops are not used
+# 'GRADIENT' linear gradient from first to last of stops (red,green,blue)
+# 'CYCLIC'   linear gradient through stops and back to first stop
+# Tables are compiled once per kind and stops.
+def paletteTable(kind="RAINBOW",stops=()):
+    stops=tuple(tuple(stop) for stop in stops)
+    key=(kind,stops)
+    table=palette_tables.get(key)
+    if table is not None:
+        return table
+    if kind=="RAINBOW":
+        table=np.array([rainbow_color.eval(value) for value in \
+                    range(TABLE_SIZE)],dtype=np.uint32)
+    elif kind in ("GRADIENT","CYCLIC"):
+        if len(stops)==0:
+            raise ValueError("Palette "+kind+" requires at least one stop")
+        rgb=np.array(stops,dtype=np.float64)
+        if kind=="CYCLIC":
+            rgb=np.vstack((rgb,rgb[:1]))
+            positions=np.linspace(0,len(stops),TABLE_SIZE,endpoint=False)
+        else:
+            positions=np.linspace(0,len(stops)-1,TABLE_SIZE)
+        indices=np.arange(len(rgb))
+        table=packRgb(np.column_stack([np.interp(positions,indices,\
+                    rgb[:,channel]) for channel in range(3)]))
+    else:
+        raise ValueError("Unknown palette "+str(kind))
+    palette_tables[key]=table
+    return table
+
+
+# Return colors of integer values as uint32 array, vectorized version of
+# RainbowColor.eval() for any palette table.
+def valueColors(values,table):
+    return table[np.asarray(values,dtype=np.int64)%len(table)]
+
+
+# Channels colors can depend on, value of each origin is
+# 'Z'        z position
+# 'RADIUS'   distance from z axis
+# 'DISTANCE' distance from center (0,0,0)
+channels=("Z","RADIUS","DISTANCE")
+
+
+# Return channel values of origins as 1-D array, calculated in one pass.
+def channelValues(origins,channel="Z"):
+    if channel=="Z":
+        return origins[:,2]
+    elif channel=="RADIUS":
+        return np.hypot(origins[:,0],origins[:,1])
+    elif channel=="DISTANCE":
+        return np.sqrt(np.einsum("ij,ij->i",origins,origins))
+    raise ValueError("Unknown channel "+str(channel))
+
+
+# Return largest absolute value, at least FLOAT_MIN to avoid division by
+# zero. This is the former abs(max) or abs(min) of listMax() and listMin().
+def channelScale(values):
+    if len(values)==0:
+        return FLOAT_MIN
+    return max(float(values.max()),-float(values.min()),FLOAT_MIN)
+
+
+# Return (smallest,largest) value, (0.0,0.0) if there are no values.
+def channelRange(values):
+    if len(values)==0:
+        return (0.0,0.0)
+    return (float(values.min()),float(values.max()))
+
+
+# Return value range colors of palette kind are spread over, see
+# scaledColors(). The rainbow keeps its mapping relative to scale, None.
+def paletteRange(kind,values):
+    if kind=="RAINBOW":
+        return None
+    return channelRange(values)
+
+
+# Return colors of origins as uint32 array. Color depends on channel
+# value relative to the largest absolute channel value of all origins.
+# table is a palette table of kind, default is the rainbow.
+def originColors(origins,drawings_max,table=None,channel="Z",kind="RAINBOW"):
+    if table is None:
+        table=paletteTable()
+    values=channelValues(origins,channel)
+    return scaledColors(values,channelScale(values),drawings_max,table,\
+                paletteRange(kind,values))
+
+
+# Return colors of channel values as uint32 array, see originColors().
+# value_range (low,high) of all values spreads values linearly over the
+# whole table, low is the first and high the last color, e.g. of gradients.
+# Without value_range colors repeat every len(table) of values relative to
+# scale times drawings_max like RainbowColor.eval().
+def scaledColors(values,scale,drawings_max,table,value_range=None):
+    if value_range is None:
+        return valueColors(np.trunc(values/scale*drawings_max),table)
+    low,high=value_range
+    position=(values-low)/max(high-low,FLOAT_MIN)*(len(table)-1)
+    index=np.clip(np.rint(position),0,len(table)-1).astype(np.int64)
+    return table[index]
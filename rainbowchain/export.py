@@ -0,0 +1,217 @@
+#-----------------------------------------------------------
+# rainbowchain/export.py
+#
+# Export of a chain for LuxCore without Blender objects. Elements are
+# calculated and written chunk by chunk of outer rows, thus memory depends
+# on the chunk size only and the chain size is limited by disk.
+# Formats by file name extension:
+# *.ply  binary little endian point list, per vertex float x,y,z, uchar
+#        red,green,blue and uint id, the packed RGB LuxCore object ID
+# *.scn  LuxCore scene, one object per element instancing a shared cube
+#        with its transformation and object ID. The cube is written next to
+#        the scene as <name>_element.ply. Material is matte colored by an
+#        objectidcolor texture like material Matte.ID of the add-on.
+#------------------------------------------------------------
+
+import os
+import re
+import numpy as np
+
+from rainbowchain.colors import channelRange, channelScale, channelValues,\
+    paletteTable, scaledColors
+from rainbowchain.patterns import countsOrigins, countsTransforms, loopCounts
+from rainbowchain.state import ChainState
+from rainbowchain.transform import elementTransforms
+
+CHUNK_SIZE=65536
+
+vertex_type=np.dtype([("x","<f4"),("y","<f4"),("z","<f4"),("red","u1"),\
+                    ("green","u1"),("blue","u1"),("id","<u4")])
+
+
+# Return slices of outer rows with about chunk_size elements each.
+def rowChunks(rows,columns,chunk_size=CHUNK_SIZE):
+    step=max(chunk_size//max(columns,1),1)
+    return [slice(start,min(start+step,rows)) for start in range(0,rows,step)]
+
+
+# Yield ChainState of chain, see rainbowchain.chain.ChainParameters, chunk
+# by chunk in drawing order. Colors are scaled to the channel values of the
+# whole chain, they are found in a first pass without keeping origins.
+# transforms is (rotation_mode,seed,rotation_jitter,scale_jitter), see
+# elementTransforms(), or None for no rotations and scales. Orientations of
+# a pattern are calculated with one row more on each side of a chunk, thus
+# they equal those of the whole chain.
+def chainChunks(chain,transforms=None,chunk_size=CHUNK_SIZE):
+    inner_counts=loopCounts(chain.inner)
+    outer_counts=loopCounts(chain.outer)
+    columns=len(inner_counts)
+    chunks=rowChunks(len(outer_counts),columns,chunk_size)
+
+    def origins(rows):
+        return countsOrigins(chain.pattern,chain.inner,chain.outer,\
+                    inner_counts,outer_counts[rows],chain.scale_factor)
+
+    scale=channelScale(np.zeros(0))
+    value_range=None
+    for rows in chunks:
+        values=channelValues(origins(rows),chain.channel)
+        scale=max(scale,channelScale(values))
+        if len(values)>0:
+            low,high=channelRange(values)
+            if value_range is not None:
+                low=min(low,value_range[0])
+                high=max(high,value_range[1])
+            value_range=(low,high)
+    if chain.palette[0]=="RAINBOW" or value_range is None:
+        value_range=None
+
+    table=paletteTable(*chain.palette)
+    drawings_max=chain.inner.loops*chain.outer.loops
+    for rows in chunks:
+        halo=slice(max(rows.start-1,0),min(rows.stop+1,len(outer_counts)))
+        grid=origins(halo)
+        inside=slice((rows.start-halo.start)*columns,\
+                    (rows.stop-halo.start)*columns)
+        chunk=grid[inside]
+        colors=scaledColors(channelValues(chunk,chain.channel),scale,\
+                    drawings_max,table,value_range)
+        handles=np.arange(rows.start*columns,rows.stop*columns)+1
+        rotations,scales=(None,None)
+        if transforms is not None:
+            if transforms[0]=="PATTERN":
+                rotations,scales=countsTransforms(chain.pattern,chain.inner,\
+                    chain.outer,inner_counts,outer_counts[halo],grid)
+                if rotations is not None:
+                    rotations=rotations[inside]
+                if scales is not None:
+                    scales=scales[inside]
+            rotations,scales=elementTransforms(handles,rotations,scales,\
+                    *transforms)
+        yield ChainState(chunk,colors,rotations,scales,handles)
+
+
+# Return number of elements of chain.
+def chainCount(chain):
+    return len(loopCounts(chain.inner))*len(loopCounts(chain.outer))
+
+
+# Return name usable in LuxCore property names, which are split at dots.
+def luxcoreName(name):
+    return re.sub(r"[^A-Za-z0-9_]","_",name)
+
+
+# Return rotation and scale of state as (N,3,3) matrices, euler XYZ like
+# Blender's rotation_euler.
+def elementMatrices(state):
+    count=len(state)
+    matrices=np.tile(np.eye(3),(count,1,1))
+    if state.rotations is not None:
+        x,y,z=state.rotations.astype(np.float64).T
+        cx,sx,cy,sy,cz,sz=np.cos(x),np.sin(x),np.cos(y),np.sin(y),\
+                            np.cos(z),np.sin(z)
+        matrices=np.stack([\
+            np.stack([cy*cz,sx*sy*cz-cx*sz,cx*sy*cz+sx*sz],axis=1),\
+            np.stack([cy*sz,sx*sy*sz+cx*cz,cx*sy*sz-sx*cz],axis=1),\
+            np.stack([-sy,sx*cy,cx*cy],axis=1)],axis=1)
+    if state.scales is not None:
+        matrices=matrices*state.scales.astype(np.float64)[:,None,:]
+    return matrices
+
+
+# Write vertices of state to binary PLY file.
+def writePlyChunk(file,state):
+    vertices=np.empty(len(state),dtype=vertex_type)
+    vertices["x"]=state.origins[:,0]
+    vertices["y"]=state.origins[:,1]
+    vertices["z"]=state.origins[:,2]
+    vertices["red"]=state.colors&0xff
+    vertices["green"]=(state.colors>>8)&0xff
+    vertices["blue"]=(state.colors>>16)&0xff
+    vertices["id"]=state.colors
+    vertices.tofile(file)
+
+
+def plyHeader(count):
+    return ("ply\nformat binary_little_endian 1.0\n"+\
+        "comment RainbowChain origins, id is packed RGB LuxCore object ID\n"+\
+        "element vertex "+str(count)+"\n"+\
+        "property float x\nproperty float y\nproperty float z\n"+\
+        "property uchar red\nproperty uchar green\nproperty uchar blue\n"+\
+        "property uint id\nend_header\n").encode("ascii")
+
+
+# Write LuxCore objects of state. Transformations are column major with the
+# translation in elements 12 to 14.
+def writeSceneChunk(file,state,prefix,material):
+    matrices=elementMatrices(state)
+    lines=[]
+    for handle,matrix,origin,color in zip(state.handles.tolist(),\
+            matrices.tolist(),state.origins.tolist(),state.colors.tolist()):
+        name="scene.objects."+prefix+str(handle)
+        transformation=" ".join(repr(value) for value in\
+            (matrix[0][0],matrix[1][0],matrix[2][0],0.0,\
+             matrix[0][1],matrix[1][1],matrix[2][1],0.0,\
+             matrix[0][2],matrix[1][2],matrix[2][2],0.0,\
+             origin[0],origin[1],origin[2],1.0))
+        lines.append(name+'.shape = "'+prefix+'element"\n'+\
+            name+'.material = "'+material+'"\n'+\
+            name+".transformation = "+transformation+"\n"+\
+            name+".id = "+str(color)+"\n")
+    file.write("".join(lines))
+
+
+# Write cube of radius as ASCII PLY of triangles, the shape of a scene.
+def writeCube(path,radius):
+    vertices=[(x*radius,y*radius,z*radius) for x in (-1,1) for y in (-1,1)\
+                for z in (-1,1)]
+    faces=[(0,1,3,2),(4,6,7,5),(0,4,5,1),(2,3,7,6),(0,2,6,4),(1,5,7,3)]
+    with open(path,"w") as file:
+        file.write("ply\nformat ascii 1.0\nelement vertex 8\n"+\
+            "property float x\nproperty float y\nproperty float z\n"+\
+            "element face 12\nproperty list uchar int vertex_indices\n"+\
+            "end_header\n")
+        for vertex in vertices:
+            file.write("%r %r %r\n" % vertex)
+        for a,b,c,d in faces:
+            file.write("3 %d %d %d\n3 %d %d %d\n" % (a,b,c,a,c,d))
+
+
+# Export chain to path, *.ply or *.scn, see top of file. material names the
+# matte material of a scene. progress(done,total) is called after each chunk.
+# Return number of elements written.
+def exportChain(path,chain,transforms=None,chunk_size=CHUNK_SIZE,\
+                progress=None,material="Matte.ID"):
+    count=chainCount(chain)
+    extension=os.path.splitext(path)[1].lower()
+    if extension not in (".ply",".scn"):
+        raise ValueError("export file must end with .ply or .scn: "+path)
+    written=0
+    if extension==".ply":
+        with open(path,"wb") as file:
+            file.write(plyHeader(count))
+# Points carry no rotation and scale.
+            for state in chainChunks(chain,None,chunk_size):
+                writePlyChunk(file,state)
+                written=written+len(state)
+                if progress is not None:
+                    progress(written,count)
+        return written
+
+    stem=os.path.splitext(os.path.basename(path))[0]
+    prefix=luxcoreName(stem)+"_"
+    material=luxcoreName(material)
+    shape=stem+"_element.ply"
+    writeCube(os.path.join(os.path.dirname(path),shape),chain.scale_factor)
+    with open(path,"w") as file:
+        file.write('scene.shapes.'+prefix+'element.type = "mesh"\n'+\
+            'scene.shapes.'+prefix+'element.ply = "'+shape+'"\n'+\
+            'scene.textures.'+prefix+'id.type = "objectidcolor"\n'+\
+            'scene.materials.'+material+'.type = "matte"\n'+\
+            'scene.materials.'+material+'.kd = "'+prefix+'id"\n')
+        for state in chainChunks(chain,transforms,chunk_size):
+            writeSceneChunk(file,state,prefix,material)
+            written=written+len(state)
+            if progress is not None:
+                progress(written,count)
+    return written
@@ -0,0 +1,224 @@
+#-----------------------------------------------------------
+# rainbowchain/expression.py
+#
+# Pattern "CUSTOM" of user defined x, y and z expressions, e.g.
+#   x: cos(inner_angle*inner_freq)*inner_radius
+#   y: sin(inner_angle*inner_freq)*inner_radius
+#   z: outer_count
+# Expressions are parsed and checked against a whitelist of operators,
+# functions and variable names, then compiled once. Compiled expressions
+# are cached by their text. The same code is evaluated with numpy arrays of
+# all counters, i.e. vectorized, or with floats point by point.
+#
+# Variables per loop, inner_ or outer_ followed by
+# count   loop counter
+# value   eval_y() of counter
+# angle   6.283*count/range
+# loops, step, freq, radius, offset   loop parameters
+#------------------------------------------------------------
+
+import ast
+import math
+import numpy as np
+
+from rainbowchain.patterns import gridOrigins
+from rainbowchain.registry import Pattern, registerPattern
+
+MAX_LENGTH=500
+
+loop_variables=("count","value","angle","loops","step","freq","radius",\
+                "offset")
+variables=set(loop+"_"+name for loop in ("inner","outer")\
+                for name in loop_variables)
+constants={"pi":math.pi,"e":math.e}
+
+# Functions by name for floats and for arrays. floor and ceil return floats
+# like all other functions, integers would defeat ConstantsToFloat, e.g.
+# floor(1e300)**floor(1e300).
+scalar_functions={"sin":math.sin,"cos":math.cos,"tan":math.tan,\
+    "asin":math.asin,"acos":math.acos,"atan":math.atan,"atan2":math.atan2,\
+    "sinh":math.sinh,"cosh":math.cosh,"tanh":math.tanh,"exp":math.exp,\
+    "log":math.log,"sqrt":math.sqrt,"hypot":math.hypot,"abs":abs,\
+    "floor":lambda value: float(math.floor(value)),\
+    "ceil":lambda value: float(math.ceil(value))}
+array_functions={"sin":np.sin,"cos":np.cos,"tan":np.tan,\
+    "asin":np.arcsin,"acos":np.arccos,"atan":np.arctan,"atan2":np.arctan2,\
+    "sinh":np.sinh,"cosh":np.cosh,"tanh":np.tanh,"exp":np.exp,\
+    "log":np.log,"sqrt":np.sqrt,"hypot":np.hypot,"abs":np.abs,\
+    "floor":np.floor,"ceil":np.ceil}
+
+operators=(ast.Add,ast.Sub,ast.Mult,ast.Div,ast.FloorDiv,ast.Mod,ast.Pow,\
+            ast.UAdd,ast.USub)
+
+
+class ConstantsToFloat(ast.NodeTransformer):
+# Checks nodes against the whitelist and turns number constants into
+# floats, thus e.g. 9**9**9 overflows at once instead of growing an integer.
+    def generic_visit(self,node):
+        if not isinstance(node,(ast.Expression,ast.BinOp,ast.UnaryOp,\
+                            ast.Call,ast.Name,ast.Load)+operators):
+            raise ValueError(type(node).__name__+" is not allowed")
+        return ast.NodeTransformer.generic_visit(self,node)
+
+    def visit_Num(self,node):
+        return self.number(node,node.n)
+
+    def visit_Constant(self,node):
+        return self.number(node,node.value)
+
+    def number(self,node,value):
+        if isinstance(value,bool) or not isinstance(value,(int,float)):
+            raise ValueError(repr(value)+" is not allowed")
+# ast.Num is replaced by ast.Constant since Python 3.6.
+        if hasattr(ast,"Constant"):
+            number=ast.Constant(value=float(value))
+        else:
+            number=ast.Num(n=float(value))
+        return ast.copy_location(number,node)
+
+    def visit_Name(self,node):
+        if node.id not in variables and node.id not in constants:
+            raise ValueError("name '"+node.id+"' is not allowed")
+        return node
+
+    def visit_Call(self,node):
+        if not isinstance(node.func,ast.Name) or\
+                node.func.id not in scalar_functions:
+            raise ValueError("only calls of "+\
+                ", ".join(sorted(scalar_functions))+" are allowed")
+        if getattr(node,"keywords",None) or getattr(node,"starargs",None)\
+                or getattr(node,"kwargs",None):
+            raise ValueError("call arguments must be positional")
+        node.args=[self.visit(argument) for argument in node.args]
+        return node
+
+
+# Compiled expressions by text.
+compiled={}
+
+
+# Return code of expression text. ValueError describes invalid expressions.
+def compileExpression(text):
+    code=compiled.get(text)
+    if code is not None:
+        return code
+    if len(text)>MAX_LENGTH:
+        raise ValueError("expression longer than "+str(MAX_LENGTH)+\
+                            " characters")
+# Deeply nested expressions exhaust the recursion of parser, ast walk or
+# compiler even below MAX_LENGTH.
+    try:
+        tree=ast.parse(text.strip(),mode="eval")
+        tree=ast.fix_missing_locations(ConstantsToFloat().visit(tree))
+        code=compile(tree,"<expression>","eval")
+    except SyntaxError as error:
+        raise ValueError("syntax error: "+str(error.msg))
+    except (RecursionError,MemoryError):
+        raise ValueError("expression nested too deeply")
+    compiled[text]=code
+    return code
+
+
+class ExpressionPattern():
+# x, y and z expressions compiled to pattern methods, see Pattern.
+    __slots__=("texts","codes")
+
+    def __init__(self,x,y,z):
+        self.texts=(x,y,z)
+        codes=[]
+        for axis,text in zip("xyz",self.texts):
+            try:
+                codes.append(compileExpression(text))
+            except ValueError as error:
+                raise ValueError("expression "+axis+": "+str(error))
+        self.codes=tuple(codes)
+
+# Return x, y and z. Expressions failing like 1/0 on floats or calls of
+# wrong argument count return nan.
+    def evaluate(self,names,scale_factor):
+        names["__builtins__"]={}
+        values=[]
+        for code in self.codes:
+            try:
+                values.append(eval(code,names)*scale_factor)
+            except (ArithmeticError,TypeError,ValueError):
+                values.append(math.nan)
+        return tuple(values)
+
+    def scalar(self,inner,outer,inner_count,outer_count,scale_factor):
+        names=dict(constants)
+        names.update(scalar_functions)
+        for prefix,loop,count in (("inner_",inner,inner_count),\
+                                    ("outer_",outer,outer_count)):
+            loopNames(names,prefix,loop)
+            names[prefix+"count"]=count
+            names[prefix+"value"]=loop.eval_y(count)
+            names[prefix+"angle"]=6.283*(count/loop.range)
+        return self.evaluate(names,scale_factor)
+
+# Inner terms are rows, outer terms are columns, the grid is formed by
+# broadcasting like the built-in array patterns.
+    def array(self,inner,outer,inner_table,outer_table,scale_factor):
+        names=dict(constants)
+        names.update(array_functions)
+        for prefix,loop,table,shape in (("inner_",inner,inner_table,(1,-1)),\
+                                    ("outer_",outer,outer_table,(-1,1))):
+            loopNames(names,prefix,loop)
+            names[prefix+"count"]=table.counts.reshape(shape)
+            names[prefix+"value"]=table.values.reshape(shape)
+            names[prefix+"angle"]=table.angles.reshape(shape)
+        with np.errstate(all="ignore"):
+            x,y,z=self.evaluate(names,1)
+        return gridOrigins(inner_table,outer_table,x,y,z,scale_factor)
+
+
+def loopNames(names,prefix,loop):
+    names[prefix+"loops"]=loop.loops
+    names[prefix+"step"]=loop.step
+    names[prefix+"freq"]=loop.freq
+    names[prefix+"radius"]=loop.radius
+    names[prefix+"offset"]=loop.offset
+
+
+# Expression patterns by (x,y,z) texts.
+patterns={}
+
+
+def expressionPattern(x,y,z):
+    pattern=patterns.get((x,y,z))
+    if pattern is None:
+        pattern=ExpressionPattern(x,y,z)
+        patterns[(x,y,z)]=pattern
+    return pattern
+
+
+default_expressions=("cos(inner_angle*inner_freq)*inner_radius",\
+                    "sin(inner_angle*inner_freq)*inner_radius",\
+                    "outer_count")
+
+# Expressions of pattern CUSTOM.
+custom=expressionPattern(*default_expressions)
+
+
+# Set expressions of pattern CUSTOM. Invalid expressions raise ValueError
+# and keep the expressions set before.
+def setCustomExpressions(x,y,z):
+    global custom
+    custom=expressionPattern(x,y,z)
+
+
+def customExpressions():
+    return custom.texts
+
+
+def patternCustom(inner,outer,inner_count,outer_count,scale_factor):
+    return custom.scalar(inner,outer,inner_count,outer_count,scale_factor)
+
+
+def patternCustomArray(inner,outer,inner_table,outer_table,scale_factor):
+    return custom.array(inner,outer,inner_table,outer_table,scale_factor)
+
+
+registerPattern(Pattern("CUSTOM","Custom Expression",patternCustom,\
+    (30,1,1,30,0),(30,1,1,30,0),patternCustomArray,\
+    "x, y and z expressions of loop counters and parameters"))
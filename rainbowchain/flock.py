@@ -0,0 +1,260 @@
+#-----------------------------------------------------------
+# rainbowchain/flock.py
+#
+# Pattern "FLOCK", a boids simulation of separation, alignment and cohesion.
+# Each element of the inner*outer grid is one boid starting at its grid
+# position. The simulation steps once per frame, neighbors are found with a
+# uniform grid spatial hash, thus a step is about O(N). State is kept
+# between calls and checkpointed, going back to an earlier frame continues
+# from the nearest checkpoint instead of frame 1. A flock is kept for equal
+# loops and steps, other parameters, e.g. keyed ones, change the running
+# simulation from the current frame on instead of restarting it. Steps
+# simulated again use the parameters they used before.
+#
+# Loop parameters of the flock:
+# inner.freq    maximum speed per frame
+# inner.radius  neighbor radius of alignment and cohesion, cell size of hash
+# inner.offset  separation weight
+# outer.freq    alignment weight
+# outer.radius  separation radius
+# outer.offset  cohesion weight
+#------------------------------------------------------------
+
+import collections
+import numpy as np
+
+from rainbowchain.patterns import loopCounts
+from rainbowchain.registry import Pattern, registerPattern
+from rainbowchain.transform import alignRotations
+
+# Frame the flock is simulated to, see setFrame().
+frame_current=1
+# Steps between checkpoints and number of checkpoints kept per flock.
+CHECKPOINT_INTERVAL=10
+CHECKPOINTS_MAX=200
+# Hash factors of cell coordinates.
+HASH=np.array([73856093,19349663,83492791],dtype=np.int64)
+OFFSETS=np.array([(x,y,z) for x in (-1,0,1) for y in (-1,0,1)\
+                for z in (-1,0,1)],dtype=np.int64)
+
+
+# Return pairs (i,j), i!=j, of positions closer than radius. Positions are
+# hashed to cells of size radius, pairs are searched in the 27 cells around
+# each position only.
+def neighborPairs(positions,radius):
+    count=len(positions)
+    cells=np.floor(positions/radius).astype(np.int64)
+    keys=cells.dot(HASH)
+    order=np.argsort(keys,kind="mergesort")
+    sorted_keys=keys[order]
+    first=[]
+    second=[]
+    for offset in OFFSETS:
+        neighbor_keys=(cells+offset).dot(HASH)
+        low=np.searchsorted(sorted_keys,neighbor_keys,side="left")
+        high=np.searchsorted(sorted_keys,neighbor_keys,side="right")
+        counts=high-low
+        total=int(counts.sum())
+        if total==0:
+            continue
+# Expand ranges low..high of all positions into one index array.
+        starts=np.repeat(low-np.cumsum(counts)+counts,counts)
+        first.append(np.repeat(np.arange(count),counts))
+        second.append(order[starts+np.arange(total)])
+    if not first:
+        empty=np.zeros(0,dtype=np.int64)
+        return (empty,empty)
+    first=np.concatenate(first)
+    second=np.concatenate(second)
+    distance=((positions[first]-positions[second])**2).sum(axis=1)
+    near=(first!=second)&(distance<radius*radius)
+    return (first[near],second[near])
+
+
+# Return sum of values per index as (count,3) array.
+def sumBy(index,values,count):
+    return np.stack([np.bincount(index,values[:,axis],count)\
+                    for axis in range(3)],axis=1)
+
+
+class Flock():
+# Simulation of one grid of inner and outer loop. positions and velocities
+# are (N,3) arrays in grid drawing order, frame is the simulated frame.
+    def __init__(self,inner,outer):
+        self.weights=None
+        self.frame=1
+        self.checkpoints=collections.OrderedDict()
+# Weights by frame they were used to step to, frame 1 for starting speed.
+        self.history={}
+        self.inner_counts=loopCounts(inner)
+        self.outer_counts=loopCounts(outer)
+
+        columns=len(self.inner_counts)
+        rows=len(self.outer_counts)
+        x=np.tile(self.inner_counts,rows)
+        y=np.repeat(self.outer_counts,columns)
+        self.initial=np.stack([x,y,np.zeros(rows*columns)],axis=1)
+# Boids start in their grid position with a seeded random heading.
+        random=np.random.RandomState(rows*100003+columns)
+        self.headings_initial=random.uniform(-1,1,(rows*columns,3))*0.5
+        self.center=self.initial.mean(axis=0) if len(self.initial) else\
+                        np.zeros(3)
+        self.extent=float(np.abs(self.initial-self.center).max())\
+                        if len(self.initial) else 0
+# Starts the flock at frame 1.
+        self.configure(inner,outer)
+
+# Set weights (speed,radius,separation,alignment,separation radius,
+# cohesion) of inner and outer for the following steps. Values other than
+# those of the next step before, e.g. changed by hand, drop the steps and
+# checkpoints after the current frame.
+    def configure(self,inner,outer):
+        weights=(max(float(inner.freq),1e-6),max(float(inner.radius),1e-6),\
+                float(inner.offset),float(outer.freq),\
+                max(float(outer.radius),1e-6),float(outer.offset))
+        if weights==self.weights:
+            return
+        self.weights=weights
+        if self.history.get(self.frame+1,weights)!=weights:
+            for number in [number for number in self.checkpoints\
+                            if number>self.frame]:
+                del self.checkpoints[number]
+            for number in [number for number in self.history\
+                            if number>self.frame]:
+                del self.history[number]
+        if self.frame==1:
+            self.history.pop(1,None)
+            self.reset()
+
+    def reset(self):
+        self.frame=1
+        weights=self.history.setdefault(1,self.weights)
+        self.positions=self.initial.copy()
+        self.velocities=self.headings_initial*weights[0]
+
+    def step(self,weights):
+        speed_max,radius,separation,alignment,separation_radius,cohesion=\
+            weights
+        positions=self.positions
+        velocities=self.velocities
+        count=len(positions)
+        if count>1:
+            first,second=neighborPairs(positions,radius)
+            neighbors=np.bincount(first,minlength=count)
+            has=neighbors>0
+            divisor=np.maximum(neighbors,1)[:,None]
+            center=sumBy(first,positions[second],count)/divisor
+            heading=sumBy(first,velocities[second],count)/divisor
+            steer=np.zeros_like(velocities)
+            steer[has]=cohesion*(center[has]-positions[has])*0.01+\
+                        alignment*(heading[has]-velocities[has])*0.1
+            difference=positions[first]-positions[second]
+            distance=(difference**2).sum(axis=1)
+            close=distance<separation_radius**2
+            push=difference[close]/np.maximum(distance[close],1e-9)[:,None]
+            steer=steer+separation*sumBy(first[close],push,count)
+            velocities=velocities+steer
+# Boids leaving the starting area are turned back softly.
+        outside=positions-self.center
+        distance=np.sqrt((outside**2).sum(axis=1))
+        away=distance>max(self.extent,radius)
+        velocities[away]-=outside[away]/distance[away][:,None]*speed_max*0.1
+        speed=np.sqrt((velocities**2).sum(axis=1))
+        fast=speed>speed_max
+        velocities[fast]*=(speed_max/speed[fast])[:,None]
+        self.velocities=velocities
+        self.positions=positions+velocities
+        self.frame=self.frame+1
+        self.history[self.frame]=weights
+        if self.frame%CHECKPOINT_INTERVAL==0:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.checkpoints[self.frame]=(self.positions,self.velocities)
+        self.checkpoints.move_to_end(self.frame)
+        while len(self.checkpoints)>CHECKPOINTS_MAX:
+            self.checkpoints.popitem(last=False)
+
+# Simulate to frame. Earlier frames restart from the nearest checkpoint
+# before frame, frames before 1 show the starting positions. Steps before
+# frame use their former weights, the step to frame the current ones.
+    def advance(self,frame):
+        frame=max(int(frame),1)
+        if frame<self.frame:
+            earlier=[number for number in self.checkpoints if number<=frame]
+            if earlier:
+                self.frame=max(earlier)
+                self.positions,self.velocities=self.checkpoints[self.frame]
+            else:
+                self.reset()
+        while self.frame<frame:
+            weights=self.weights
+            if self.frame+1<frame:
+                weights=self.history.get(self.frame+1,weights)
+            self.step(weights)
+        return self.positions
+
+# Return values of the elements at the counters of inner_counts and
+# outer_counts, e.g. strided or limited rows, as (N,3) array.
+    def elements(self,values,inner_counts,outer_counts):
+        columns=np.searchsorted(self.inner_counts,inner_counts)
+        rows=np.searchsorted(self.outer_counts,outer_counts)
+        grid=values.reshape(len(self.outer_counts),len(self.inner_counts),3)
+        return grid[rows][:,columns].reshape(-1,3)
+
+    def origins(self,inner_counts,outer_counts):
+        return self.elements(self.advance(frame_current),inner_counts,\
+                    outer_counts)
+
+# Return velocities of the elements, see elements().
+    def headings(self,inner_counts,outer_counts):
+        self.advance(frame_current)
+        return self.elements(self.velocities,inner_counts,outer_counts)
+
+
+# Flocks by loops and steps of inner and outer, the last used are kept.
+flocks=collections.OrderedDict()
+FLOCKS_MAX=4
+
+
+def flockOf(inner,outer):
+    key=(inner.loops,inner.step,outer.loops,outer.step)
+    flock=flocks.get(key)
+    if flock is None:
+        flock=Flock(inner,outer)
+        flocks[key]=flock
+        while len(flocks)>FLOCKS_MAX:
+            flocks.popitem(last=False)
+    else:
+        flock.configure(inner,outer)
+    flocks.move_to_end(key)
+    return flock
+
+
+# Set frame the flock is drawn at, e.g. scene.frame_current.
+def setFrame(frame):
+    global frame_current
+    frame_current=frame
+
+
+def patternFlock(inner,outer,inner_count,outer_count,scale_factor):
+    origin=flockOf(inner,outer).origins(np.array([inner_count]),\
+                np.array([outer_count]))[0]
+    return tuple(float(value)*scale_factor for value in origin)
+
+
+def patternFlockArray(inner,outer,inner_table,outer_table,scale_factor):
+    return flockOf(inner,outer).origins(inner_table.counts,\
+                outer_table.counts)*scale_factor
+
+
+# Boids are turned to their heading.
+def orientFlock(inner,outer,inner_table,outer_table,origins):
+    return (alignRotations(flockOf(inner,outer).headings(inner_table.counts,\
+                outer_table.counts)),None)
+
+
+registerPattern(Pattern("FLOCK","Flock",patternFlock,\
+    (30,1,0.3,3,0.5),(30,1,0.5,1,0.5),patternFlockArray,\
+    "Boids simulation of separation, alignment and cohesion per frame",\
+    stateful=True,orient=orientFlock))
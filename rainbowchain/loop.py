@@ -0,0 +1,51 @@
+#-----------------------------------------------------------
+# rainbowchain/loop.py
+#
+# Parameters of inner or outer loop without Blender, see LoopData of
+# RainbowChainPanelAddon.py.
+#------------------------------------------------------------
+
+
+class Loop():
+# Example use: x=sin(frequency*angle)*radius 
+# min to max defines range of loop with step width step.
+# loop_range is range used for angles. Add-on keeps range of its defaults,
+# thus pass LoopData.range to get same results.
+    __slots__=("loops","step","freq","radius","offset","min","max","range")
+
+    def __init__(self,loops,step,freq,radius,offset,loop_range=None):
+        self.loops=loops
+        self.step=step
+        self.freq=freq
+        self.radius=radius
+        self.offset=offset
+
+        self.min=0
+        self.max=self.loops*self.step
+        if loop_range is None:
+            self.range=self.max-self.min
+        else:
+            self.range=loop_range
+
+# Return parameters (loops,step,freq,radius,offset,range) as tuple,
+# Loop(*loop.parameters()) is equal to loop.
+    def parameters(self):
+        return (self.loops,self.step,self.freq,self.radius,self.offset,\
+                self.range)
+
+# eval_y(x) calculates y based on x y=a*x+b, x is counter or array of counters.
+# The function is used because number of loops and steps can be defined freely.
+# Adjustable step width leads to variable maximum of inner and outer loop.
+    def eval_y(self,x):
+        a,b=self.slope()
+        return a*x+b
+
+# Return slope a and intercept b of eval_y().
+    def slope(self):
+        x1=self.min
+        x2=self.loops-1
+        y1=1
+        y2=self.loops*self.step
+        a=(y2-y1)/(x2-x1)
+        b=y2-a*x2
+        return (a,b)
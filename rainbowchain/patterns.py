@@ -0,0 +1,368 @@
+#-----------------------------------------------------------
+# rainbowchain/patterns.py
+#
+# Pattern methods calculate origins of the inner*outer grid. The scalar
+# methods calculate one origin per call and are the reference. The
+# vectorized methods calculate all origins in one pass. Loop values are 1-D
+# AxisTable arrays calculated once per axis, grid values are 2-D arrays
+# [outer_counter,inner_counter] formed by broadcasting and outer products.
+# Both return a (N,3) float array in drawing order, i.e. outer loop first.
+#
+# inner and outer are rainbowchain.loop.Loop objects, e.g. LoopData of
+# the add-on. Patterns are registered at the end of this file, see
+# rainbowchain/registry.py.
+#------------------------------------------------------------
+
+import math
+import numpy as np
+
+from rainbowchain.registry import Pattern, patternOf, registerPattern
+from rainbowchain.transform import normalRotations, tangentRotations
+
+
+def patternCloud(inner,outer,inner_count,outer_count,scale_factor):
+    inner_cpr=inner_count/inner.range
+    inner_angle=6.283*inner_cpr
+
+    outer_cpr=outer_count/outer.range
+    outer_angle=6.283*outer_cpr
+
+    inner_value=inner.eval_y(inner_count)
+    outer_value=outer.eval_y(outer_count)
+    
+    loops_value=inner_value*outer_value
+    loops_cpr=loops_value/(inner.max*outer.max)
+    loops_angle=6.283*loops_cpr
+    
+    x=math.sin(inner_angle*inner.freq)*inner.radius
+    y=math.cos(inner_angle*inner.freq)*inner.radius
+    x=x+math.sin(loops_angle*outer.freq)*outer.radius
+    y=y+math.cos(loops_angle*outer.freq)*outer.radius
+
+    z=inner_value%(inner.max+inner.step)*inner.offset
+
+# Return resized axis offset. This is in accordance 
+# with added objects size. 
+    return (x*scale_factor,y*scale_factor,z*scale_factor) 
+
+
+def patternSinCos(inner,outer,inner_count,outer_count,scale_factor):
+    inner_cpr=inner_count/inner.range
+    inner_angle=6.283*inner_cpr
+
+    outer_cpr=outer_count/outer.range
+    outer_angle=6.283*outer_cpr
+
+    inner_value=inner.eval_y(inner_count)
+    outer_value=outer.eval_y(outer_count)
+    
+    loops_value=inner_value*outer_value
+    loops_cpr=loops_value/(inner.max*outer.max)
+    loops_angle=6.283*loops_cpr
+
+# Add +random.random()*<loop_type>.random_offset to get position variances.           
+    x=inner_count
+    y=outer_count
+# z positions may depend on both x and y offsets. Center point is at position 
+# (0,0,0) all other other points have at least one axis offset. 
+    z=math.sin(inner_angle*inner.freq+inner.offset)**2*inner.radius+\
+        math.cos(outer_angle*outer.freq+outer.offset)**2*outer.radius
+
+    return (x*scale_factor,y*scale_factor,z*scale_factor) 
+
+
+def patternGauss(inner,outer,inner_count,outer_count,scale_factor):
+# sigma	s	1
+# µ	        0
+  	
+#  d(s)                a(x),(µ,s)	b(x)	       c(x)	   var	g(x),(µ,s)
+#  1/(s*sqrt(2*pi))    (x-µ)/s	   -1/2*a(x)^2	   e^b(x)	x	d(s)*c(x)
+
+# math.exp(x)  Use ** or the built-in pow()for exact integer powers.
+# math.pi    math.e      math.hypot(x, y) Return the Euclidean norm, sqrt(x*x + y*y).
+    x=inner_count+inner.offset
+    y=outer_count+outer.offset
+    s=outer.freq
+    mu=inner.freq
+    d=1/(s*math.sqrt(2*math.pi))
+    x_a=(x-mu)/s
+    x_b=-0.5*x_a**2
+    x_c=math.exp(x_b)
+    x_g=d*x_c
+    y_a=(y-mu)/s
+    y_b=-0.5*y_a**2
+    y_c=math.exp(y_b)
+    y_g=d*y_c
+    z=x_g*inner.radius+y_g*outer.radius
+    
+    return (x*scale_factor,y*scale_factor,z*scale_factor) 
+
+
+def patternBoid(inner,outer,inner_count,outer_count,scale_factor):
+    inner_cpr=inner_count/inner.range
+    inner_angle=6.283*inner_cpr
+
+    outer_cpr=outer_count/outer.range
+    outer_angle=6.283*outer_cpr
+
+    inner_value=inner.eval_y(inner_count)
+    outer_value=outer.eval_y(outer_count)
+    
+    loops_value=inner_value*outer_value
+    loops_cpr=loops_value/(inner.max*outer.max)
+    loops_angle=6.283*loops_cpr
+    
+#    x=math.sin(inner_angle*inner.freq)*inner.radius+inner.offset
+#    y=math.cos(inner_angle*inner.freq)*inner.radius+inner.offset
+
+    x=inner_count
+    y=outer_count
+
+    z=-(inner.radius*(x+inner.offset)**2+outer.radius*(y+outer.offset)**2)
+
+    x=inner_count*inner.radius
+    y=outer_count*outer.radius
+    
+# Return resized axis offset. This is in accordance 
+# with added objects size. 
+    return (x*scale_factor,y*scale_factor,z*scale_factor) 
+
+
+# Add your own pattern method below this comment lines in the following style
+# or in a module of your own, see rainbowchain/registry.py.
+# def patternOwnMethod(inner,outer,inner_count,outer_count,scale_factor):
+# ... code to calculate x,y,z ...
+#   return (x*scale_factor,y*scale_factor,z*scale_factor) 
+# Add the array version of your method below too, it is optional.
+
+
+# Reference path, calls the per point pattern method for each grid point.
+def patternScalarArray(method,inner,outer,inner_counts,outer_counts,\
+                scale_factor):
+    origins=[method(inner,outer,inner_count,outer_count,scale_factor)\
+                for outer_count in outer_counts.tolist()\
+                for inner_count in inner_counts.tolist()]
+    return np.array(origins,dtype=np.float64).reshape(-1,3)
+
+
+# Vectorized pattern methods, same math with 1-D tables of each axis.
+
+# Return counts of a loop as 1-D array. Counts are summed up step by step
+# exactly like in the former drawing loops to get identical values.
+def loopCounts(loop):
+    counts=[]
+    count=loop.min
+    while count<loop.max:
+        counts.append(count)
+        count=count+loop.step
+    return np.array(counts,dtype=np.float64)
+
+
+class AxisTable():
+# Terms of one loop which depend on its counter only, calculated once per
+# redraw. Trigonometric functions are called once per counter instead of
+# once per grid point.
+# counts  loop counters
+# values  eval_y() of counters
+# angles  6.283*counts/range
+# sin,cos sin(freq*angle), cos(freq*angle)
+    __slots__=("loop","counts","values","angles","sin","cos")
+
+    def __init__(self,loop,counts):
+        self.loop=loop
+        self.counts=counts
+        a,b=loop.slope()
+        self.values=a*counts+b
+        self.angles=6.283*(counts/loop.range)
+        phases=self.angles*loop.freq
+        self.sin=np.sin(phases)
+        self.cos=np.cos(phases)
+
+    def __len__(self):
+        return len(self.counts)
+
+# Return sin(freq*angle+phase) of counters.
+    def sinPhase(self,phase):
+        return np.sin(self.angles*self.loop.freq+phase)
+
+# Return cos(freq*angle+phase) of counters.
+    def cosPhase(self,phase):
+        return np.cos(self.angles*self.loop.freq+phase)
+
+
+# Broadcast x,y,z to grid shape and return resized axis offsets as (N,3) array.
+# x,y,z are resized before broadcasting, the origins are written only once.
+def gridOrigins(inner_table,outer_table,x,y,z,scale_factor):
+    shape=(len(outer_table),len(inner_table))
+    origins=np.empty(shape+(3,),dtype=np.float64)
+    origins[...,0]=np.multiply(x,scale_factor)
+    origins[...,1]=np.multiply(y,scale_factor)
+    origins[...,2]=np.multiply(z,scale_factor)
+    return origins.reshape(-1,3)
+
+
+# The loops angle depends on the product of both counters, only its sin and
+# cos are calculated per grid point.
+def patternCloudArray(inner,outer,inner_table,outer_table,scale_factor):
+    loops_value=np.multiply.outer(outer_table.values,inner_table.values)
+    loops_angle=loops_value*(6.283*outer.freq/(inner.max*outer.max))
+
+    x=inner_table.sin*inner.radius+np.sin(loops_angle)*outer.radius
+    y=inner_table.cos*inner.radius+np.cos(loops_angle)*outer.radius
+
+    z=inner_table.values%(inner.max+inner.step)*inner.offset
+
+    return gridOrigins(inner_table,outer_table,x,y,z,scale_factor)
+
+
+def patternSinCosArray(inner,outer,inner_table,outer_table,scale_factor):
+    x=inner_table.counts
+    y=outer_table.counts[:,None]
+    z=(inner_table.sinPhase(inner.offset)**2*inner.radius)+\
+        (outer_table.cosPhase(outer.offset)**2*outer.radius)[:,None]
+
+    return gridOrigins(inner_table,outer_table,x,y,z,scale_factor)
+
+
+def patternGaussArray(inner,outer,inner_table,outer_table,scale_factor):
+    x=inner_table.counts+inner.offset
+    y=outer_table.counts+outer.offset
+    s=outer.freq
+    mu=inner.freq
+    d=1/(s*math.sqrt(2*math.pi))
+    x_g=d*np.exp(-0.5*((x-mu)/s)**2)
+    y_g=d*np.exp(-0.5*((y-mu)/s)**2)
+    z=x_g*inner.radius+(y_g*outer.radius)[:,None]
+
+    return gridOrigins(inner_table,outer_table,x,y[:,None],z,scale_factor)
+
+
+def patternBoidArray(inner,outer,inner_table,outer_table,scale_factor):
+    z=-(inner.radius*(inner_table.counts+inner.offset)**2+\
+        (outer.radius*(outer_table.counts+outer.offset)**2)[:,None])
+
+    x=inner_table.counts*inner.radius
+    y=outer_table.counts[:,None]*outer.radius
+
+    return gridOrigins(inner_table,outer_table,x,y,z,scale_factor)
+
+
+# Orient methods, rotations of the elements from the origin grid.
+def orientTangent(inner,outer,inner_table,outer_table,origins):
+    return (tangentRotations(origins,len(outer_table),len(inner_table)),None)
+
+
+def orientNormal(inner,outer,inner_table,outer_table,origins):
+    return (normalRotations(origins,len(outer_table),len(inner_table)),None)
+
+
+# Add the array version of your method below in the following style.
+# def patternOwnMethodArray(inner,outer,inner_table,outer_table,scale_factor):
+# ... code to calculate x,y,z from AxisTable terms, outer terms broadcast
+# with [:,None] ...
+#   return gridOrigins(inner_table,outer_table,x,y,z,scale_factor)
+
+
+# Built-in patterns with default values of inner and outer loop in the order
+# (<Number of Loops>,<Step Width>,<Frequency>,<Radius>,<Offset>).
+# Add your own pattern below this comment lines like
+#   registerPattern(Pattern("PATTERNNAME","PatternName",patternOwnMethod,\
+#       (30,0.05,1,30,-0.6),(30,0.05,1,30,-0.6),patternOwnMethodArray))
+registerPattern(Pattern("CLOUD","Cloud",patternCloud,\
+    (30,1,1,30,1.5),(30,1,0.5,30,0),patternCloudArray,orient=orientTangent))
+registerPattern(Pattern("SINCOS","SinCos",patternSinCos,\
+    (30,1,0.5,30,-1.5),(30,1,0.5,30,0),patternSinCosArray,\
+    orient=orientNormal))
+registerPattern(Pattern("GAUSS","Gauss",patternGauss,\
+    (30,0.5,0,30,-7.5),(30,0.5,1.25,30,-7.5),patternGaussArray,\
+    orient=orientNormal))
+registerPattern(Pattern("BOID","Boid",patternBoid,\
+    (30,0.05,1,30,-0.6),(30,0.05,1,30,-0.6),patternBoidArray,\
+    orient=orientNormal))
+
+
+# Return outer counts limited to the rows drawable with objects_available
+# objects, None means no limit. A row is drawn if at least inner.loops
+# objects are left.
+def limitRows(inner,inner_counts,outer_counts,objects_available):
+    if objects_available is None:
+        return outer_counts
+    rows=0
+    while rows<len(outer_counts) and \
+            objects_available>=rows*len(inner_counts)+inner.loops:
+        rows=rows+1
+    return outer_counts[:rows]
+
+
+# Return inner and outer counts of the grid, see patternOriginsArray().
+def gridCounts(inner,outer,objects_available=None,stride=1):
+    inner_counts=loopCounts(inner)
+    outer_counts=limitRows(inner,inner_counts,loopCounts(outer),\
+                    objects_available)
+    return (inner_counts[::stride],outer_counts[::stride])
+
+
+# Return index of the elements of every stride-th row and column in the
+# full grid's drawing order, see patternOriginsArray().
+def strideIndex(inner,outer,objects_available=None,stride=1):
+    inner_counts=loopCounts(inner)
+    outer_counts=limitRows(inner,inner_counts,loopCounts(outer),\
+                    objects_available)
+    rows=np.arange(0,len(outer_counts),stride)
+    columns=np.arange(0,len(inner_counts),stride)
+    return (rows[:,None]*len(inner_counts)+columns).ravel()
+
+
+# Return origins of pattern as (N,3) array. A stride above 1 calculates
+# every stride-th row and column only, e.g. for previews. Patterns without
+# vectorized method are calculated point by point.
+def patternOriginsArray(pattern,inner,outer,scale_factor,objects_available=None,\
+                stride=1):
+    inner_counts,outer_counts=gridCounts(inner,outer,objects_available,stride)
+    return countsOrigins(pattern,inner,outer,inner_counts,outer_counts,\
+                    scale_factor)
+
+
+# Return origins of the grid of inner_counts and outer_counts, e.g. a chunk
+# of rows, as (N,3) array, see patternOriginsArray().
+def countsOrigins(pattern,inner,outer,inner_counts,outer_counts,scale_factor):
+    method=patternOf(pattern).array
+    if method is None:
+        return patternScalarArray(patternOf(pattern).scalar,inner,outer,\
+                    inner_counts,outer_counts,scale_factor)
+    return method(inner,outer,AxisTable(inner,inner_counts),\
+                    AxisTable(outer,outer_counts),scale_factor)
+
+
+# Return origins of pattern as (N,3) array calculated point by point.
+def patternOriginsScalar(pattern,inner,outer,scale_factor,objects_available=None,\
+                stride=1):
+    inner_counts,outer_counts=gridCounts(inner,outer,objects_available,stride)
+    return patternScalarArray(patternOf(pattern).scalar,inner,outer,\
+                    inner_counts,outer_counts,scale_factor)
+
+
+# Return (rotations,scales) of origins of pattern, see Pattern.orient.
+# (None,None) if the pattern does not orient its elements or origins do not
+# match the grid, e.g. a baked frame of other loop parameters.
+def patternTransforms(pattern,inner,outer,origins,objects_available=None,\
+                stride=1):
+    inner_counts,outer_counts=gridCounts(inner,outer,objects_available,stride)
+    return countsTransforms(pattern,inner,outer,inner_counts,outer_counts,\
+                    origins)
+
+
+# Return (rotations,scales) of origins of the grid of inner_counts and
+# outer_counts, see patternTransforms().
+def countsTransforms(pattern,inner,outer,inner_counts,outer_counts,origins):
+    method=patternOf(pattern).orient
+    if method is None or len(origins)!=len(inner_counts)*len(outer_counts):
+        return (None,None)
+    return method(inner,outer,AxisTable(inner,inner_counts),\
+                    AxisTable(outer,outer_counts),origins)
+
+
+# Pattern of user defined expressions, see rainbowchain/expression.py.
+import rainbowchain.expression
+# Boids flocking simulation, see rainbowchain/flock.py.
+import rainbowchain.flock
@@ -0,0 +1,85 @@
+#-----------------------------------------------------------
+# rainbowchain/registry.py
+#
+# Registry of patterns. A pattern carries its enum entry, default loop
+# values, its per point method and optionally its vectorized method, see
+# rainbowchain/patterns.py. The built-in patterns are registered there,
+# other add-ons register their own patterns the same way:
+#   from rainbowchain.registry import Pattern, registerPattern
+#   registerPattern(Pattern("SPIRAL","Spiral",patternSpiral,\
+#       (30,1,1,30,0),(30,1,0.5,30,0),patternSpiralArray))
+# Methods are looked up once per chain, not per element. Bake workers
+# import the module of the methods to find the pattern, thus keep pattern
+# methods in a module without Blender imports.
+#------------------------------------------------------------
+
+import collections
+import importlib
+
+
+class Pattern():
+# identifier  enum identifier, e.g. "CLOUD"
+# name        name shown in the user interface
+# scalar      method(inner,outer,inner_count,outer_count,scale_factor)
+#             returning one origin (x,y,z)
+# inner,outer default (loops,step,freq,radius,offset) of the loops
+# array       method(inner,outer,inner_table,outer_table,scale_factor)
+#             returning all origins as (N,3) array or None
+# stateful    origins depend on the frame too, e.g. a simulation, thus
+#             frames are drawn and baked in order and not cached by
+#             parameters only
+# orient      method(inner,outer,inner_table,outer_table,origins) returning
+#             (rotations,scales) as (N,3) arrays or None each, see
+#             rainbowchain/transform.py, or None
+    __slots__=("identifier","name","scalar","inner","outer","array",\
+                "description","stateful","orient")
+
+    def __init__(self,identifier,name,scalar,inner,outer,array=None,\
+                description="",stateful=False,orient=None):
+        self.identifier=identifier
+        self.name=name
+        self.scalar=scalar
+        self.inner=tuple(inner)
+        self.outer=tuple(outer)
+        self.array=array
+        self.description=description
+        self.stateful=stateful
+        self.orient=orient
+
+# Return module of the pattern methods, see bake workers.
+    def module(self):
+        return self.scalar.__module__
+
+
+# Registered patterns by identifier in order of registration.
+registered=collections.OrderedDict()
+
+
+# Register pattern, a pattern of equal identifier is replaced.
+def registerPattern(pattern):
+    registered[pattern.identifier]=pattern
+
+
+def unregisterPattern(identifier):
+    registered.pop(identifier,None)
+
+
+# Return pattern of identifier. module is imported first if the pattern is
+# unknown, e.g. in a worker process.
+def patternOf(identifier,module=None):
+    if identifier not in registered and module is not None:
+        importlib.import_module(module)
+    try:
+        return registered[identifier]
+    except KeyError:
+        raise KeyError("Unknown pattern: "+str(identifier))
+
+
+# Return items of pattern enum (identifier,name,description,number).
+def patternItems():
+    return [(pattern.identifier,pattern.name,pattern.description,number)\
+            for number,pattern in enumerate(registered.values(),1)]
+
+
+# Built-in patterns are registered first, before patterns of other modules.
+import rainbowchain.patterns
@@ -0,0 +1,53 @@
+#-----------------------------------------------------------
+# rainbowchain/state.py
+#
+# Compact array backed state of a chain. Arrays are contiguous, thus they
+# can be handed over to bulk writes like foreach_set() without copying.
+#------------------------------------------------------------
+
+import numpy as np
+
+
+class ChainState():
+# One row per element in drawing order.
+# origins    float32 (N,3) locations
+# rotations  float32 (N,3) euler rotations or None if not calculated
+# scales     float32 (N,3) scales or None if not calculated
+# colors     uint32  (N,)  packed RGB, e.g. LuxCore object ID
+# handles    int32   (N,)  object of element, suffix number of object name
+# Arrays of matching type are used without copy.
+    __slots__=("origins","rotations","scales","colors","handles")
+
+    def __init__(self,origins,colors,rotations=None,scales=None,handles=None):
+        self.origins=np.ascontiguousarray(origins,dtype=np.float32)
+        self.colors=np.ascontiguousarray(colors,dtype=np.uint32)
+        self.rotations=self.vectors(rotations)
+        self.scales=self.vectors(scales)
+        if handles is None:
+            handles=np.arange(1,len(self.origins)+1,dtype=np.int32)
+        self.handles=np.ascontiguousarray(handles,dtype=np.int32)
+
+    def vectors(self,values):
+        if values is None:
+            return None
+        return np.ascontiguousarray(values,dtype=np.float32)
+
+    def __len__(self):
+        return len(self.origins)
+
+# Return size of all arrays in bytes.
+    def nbytes(self):
+        size=self.origins.nbytes+self.colors.nbytes+self.handles.nbytes
+        for values in (self.rotations,self.scales):
+            if values is not None:
+                size=size+values.nbytes
+        return size
+
+# Return state of elements index, a slice returns views without copy.
+    def subset(self,index):
+        def part(values):
+            if values is None:
+                return None
+            return values[index]
+        return ChainState(self.origins[index],self.colors[index],\
+                    part(self.rotations),part(self.scales),self.handles[index])
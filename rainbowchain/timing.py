@@ -0,0 +1,112 @@
+#-----------------------------------------------------------
+# rainbowchain/timing.py
+#
+# Timers of the stages of a redraw, e.g. pattern evaluation, color mapping
+# and write back. Times of the last redraw and totals of the session are
+# kept per stage and can be written as JSON or CSV. Optional cProfile
+# capture of whole redraws.
+#------------------------------------------------------------
+
+import collections
+import contextlib
+import cProfile
+import csv
+import json
+import pstats
+import time
+
+columns=("stage","calls","total","mean","min","max","last")
+
+
+class StageTimer():
+# stages  stage name -> [calls,total,min,max] of the session, seconds
+# last    stage name -> seconds of the last redraw
+# counts  count name -> value of the last redraw, e.g. elements written
+    def __init__(self):
+        self.reset()
+        self.profile=None
+
+    def reset(self):
+        self.stages=collections.OrderedDict()
+        self.last=collections.OrderedDict()
+        self.counts=collections.OrderedDict()
+        self.redraws=0
+
+# Start a redraw, times of the last redraw are cleared.
+    def begin(self):
+        self.last=collections.OrderedDict()
+        self.counts=collections.OrderedDict()
+        self.redraws=self.redraws+1
+
+    def add(self,name,seconds):
+        stage=self.stages.get(name)
+        if stage is None:
+            self.stages[name]=[1,seconds,seconds,seconds]
+        else:
+            stage[0]=stage[0]+1
+            stage[1]=stage[1]+seconds
+            stage[2]=min(stage[2],seconds)
+            stage[3]=max(stage[3],seconds)
+        self.last[name]=self.last.get(name,0.0)+seconds
+
+# Use: with timer.stage("pattern"): ...
+    @contextlib.contextmanager
+    def stage(self,name):
+        start=time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name,time.perf_counter()-start)
+
+    def count(self,name,value):
+        self.counts[name]=self.counts.get(name,0)+value
+
+# Return one row per stage in order of first use, see columns.
+    def rows(self):
+        rows=[]
+        for name,(calls,total,low,high) in self.stages.items():
+            rows.append((name,calls,total,total/calls,low,high,\
+                        self.last.get(name,0.0)))
+        return rows
+
+    def asDict(self):
+        return {"redraws":self.redraws,\
+                "counts":dict(self.counts),\
+                "stages":[dict(zip(columns,row)) for row in self.rows()]}
+
+# Write times as JSON if path ends with .json, otherwise as CSV.
+    def write(self,path):
+        if path.lower().endswith(".json"):
+            self.writeJson(path)
+        else:
+            self.writeCsv(path)
+
+    def writeJson(self,path):
+        with open(path,"w") as file:
+            json.dump(self.asDict(),file,indent=2)
+
+    def writeCsv(self,path):
+        with open(path,"w",newline="") as file:
+            writer=csv.writer(file)
+            writer.writerow(columns)
+            writer.writerows(self.rows())
+
+# cProfile capture, calls between enable() and disable() are accumulated.
+    def enable(self):
+        if self.profile is None:
+            self.profile=cProfile.Profile()
+        self.profile.enable()
+
+    def disable(self):
+        if self.profile is not None:
+            self.profile.disable()
+
+# Write captured profile as pstats file, return False if nothing captured.
+    def writeProfile(self,path):
+        if self.profile is None:
+            return False
+        self.profile.create_stats()
+        if not self.profile.stats:
+            return False
+        pstats.Stats(self.profile).dump_stats(path)
+        return True
@@ -0,0 +1,98 @@
+#-----------------------------------------------------------
+# rainbowchain/transform.py
+#
+# Rotation and scale channels of chain elements. Patterns may orient their
+# elements, e.g. along the curve tangent or the surface normal of the
+# origin grid, see Pattern.orient. Random rotations and jitter are derived
+# from the seed and the handle of an element, thus they are equal on every
+# machine and do not depend on preview stride or number of objects drawn.
+#------------------------------------------------------------
+
+import numpy as np
+
+# Rotation modes of elementTransforms().
+# RANDOM   rotation of 0 to 1 radians per axis from seed and handle
+# PATTERN  rotation of the pattern's orient method, none is (0,0,0)
+# KEEP     rotations are not written, objects keep their rotation
+rotation_modes=("RANDOM","PATTERN","KEEP")
+
+SEED_MIX=0xBF58476D1CE4E5B9
+
+
+# Return directions along the inner and along the outer loop of origins of a
+# rows*columns grid as two (N,3) arrays. Loops of one element give zeros.
+def gridAxes(origins,rows,columns):
+    grid=np.asarray(origins,dtype=np.float64).reshape(rows,columns,3)
+    along_inner=np.zeros_like(grid)
+    along_outer=np.zeros_like(grid)
+    if columns>1:
+        along_inner=np.gradient(grid,axis=1)
+    if rows>1:
+        along_outer=np.gradient(grid,axis=0)
+    return (along_inner.reshape(-1,3),along_outer.reshape(-1,3))
+
+
+# Return euler XYZ rotations turning the local z axis to directions as (N,3)
+# array. Directions of length 0 give rotation (0,0,0).
+def alignRotations(directions):
+    x,y,z=np.asarray(directions,dtype=np.float64).T
+    rotations=np.zeros((len(x),3))
+    rotations[:,0]=np.arctan2(-y,np.hypot(x,z))
+    rotations[:,1]=np.arctan2(x,z)
+    return rotations
+
+
+# Rotations of origins aligned to the tangent of the inner loop.
+def tangentRotations(origins,rows,columns):
+    along_inner,along_outer=gridAxes(origins,rows,columns)
+    return alignRotations(along_inner)
+
+
+# Rotations of origins aligned to the normal of the surface of the grid.
+def normalRotations(origins,rows,columns):
+    along_inner,along_outer=gridAxes(origins,rows,columns)
+    return alignRotations(np.cross(along_inner,along_outer))
+
+
+# Return floats in [0,1) of handles, equal for equal handle, seed and
+# channel. Integer hash (splitmix64) instead of a random generator, thus
+# any subset of the chain gets the values of the full chain.
+def hashUniform(handles,seed,channel):
+    value=np.asarray(handles,dtype=np.int64).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        value=value*np.uint64(0x9E3779B97F4A7C15)+\
+            np.uint64((int(seed)*64+channel+1)*SEED_MIX%2**64)
+        value=(value^(value>>np.uint64(30)))*np.uint64(0xBF58476D1CE4E5B9)
+        value=(value^(value>>np.uint64(27)))*np.uint64(0x94D049BB133111EB)
+        value=value^(value>>np.uint64(31))
+    return (value>>np.uint64(11)).astype(np.float64)*(1.0/2**53)
+
+
+# Return uniform jitter in [-amount,amount) of handles.
+def jitter(handles,seed,channel,amount):
+    return (hashUniform(handles,seed,channel)*2-1)*amount
+
+
+# Return (rotations,scales) of elements with handles, None is not written.
+# rotations and scales of the pattern are used in mode PATTERN, see
+# rotation_modes. rotation_jitter adds up to that many radians per axis,
+# scale_jitter scales each element uniformly by 1 plus or minus up to that.
+def elementTransforms(handles,rotations,scales,mode,seed=0,rotation_jitter=0,\
+                scale_jitter=0):
+    handles=np.asarray(handles)
+    if mode=="RANDOM":
+        rotations=np.stack([hashUniform(handles,seed,axis)\
+                    for axis in range(3)],axis=1)
+    elif mode=="PATTERN":
+        if rotations is None:
+            rotations=np.zeros((len(handles),3))
+    else:
+        rotations=None
+    if rotations is not None and rotation_jitter>0:
+        rotations=rotations+np.stack([jitter(handles,seed,3+axis,\
+                    rotation_jitter) for axis in range(3)],axis=1)
+    if scale_jitter>0:
+        if scales is None:
+            scales=np.ones((len(handles),3))
+        scales=scales*(1+jitter(handles,seed,6,scale_jitter))[:,None]
+    return (rotations,scales)
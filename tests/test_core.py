@@ -0,0 +1,401 @@
+#-----------------------------------------------------------
+# tests/test_core.py
+#
+# Headless checks of the rainbowchain core, no Blender needed. Run from the
+# repository root:
+# python -m unittest discover -s tests
+# python -m pytest tests
+#------------------------------------------------------------
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import rainbowchain.flock as flock
+from rainbowchain.__main__ import main
+from rainbowchain.bake import PointCache, bakeFrames
+from rainbowchain.chain import ChainParameters, presetParameters
+from rainbowchain.colors import TABLE_SIZE, channelValues, originColors,\
+    packRgb, paletteTable, stopColors
+from rainbowchain.export import chainCount, exportChain
+from rainbowchain.expression import compileExpression, expressionPattern
+from rainbowchain.flock import setFrame
+from rainbowchain.loop import Loop
+from rainbowchain.patterns import patternOriginsArray, patternOriginsScalar
+from rainbowchain.registry import Pattern, patternItems, patternOf,\
+    registerPattern, unregisterPattern
+from rainbowchain.transform import elementTransforms
+
+
+# Return (inner,outer) loops of the preset of pattern with step widths
+# multiplied by step_factor, e.g. 0.7 for non-integer steps.
+def presetLoops(pattern,step_factor=1):
+    name,inner,outer=presetParameters(pattern)
+    loops=[]
+    for parameters in (inner[1:],outer[1:]):
+        loops_number,step,freq,radius,offset=parameters
+        loops.append(Loop(min(loops_number,12),step*step_factor,freq,radius,\
+                        offset))
+    return loops
+
+
+class PatternTest(unittest.TestCase):
+# Vectorized methods must give the origins of the point by point methods.
+    def test_array_equals_scalar(self):
+        setFrame(7)
+        for identifier,name,description,number in patternItems():
+            for step_factor in (1,0.7,1.3):
+                inner,outer=presetLoops(identifier,step_factor)
+                with self.subTest(pattern=identifier,step_factor=step_factor):
+                    array=patternOriginsArray(identifier,inner,outer,0.1)
+                    scalar=patternOriginsScalar(identifier,inner,outer,0.1)
+                    self.assertEqual(array.shape,scalar.shape)
+                    self.assertTrue(len(array)>0)
+                    np.testing.assert_allclose(array,scalar,rtol=1e-9,\
+                                    atol=1e-9)
+
+    def test_objects_available(self):
+        inner,outer=presetLoops("SINCOS",0.7)
+        array=patternOriginsArray("SINCOS",inner,outer,0.1,25)
+        scalar=patternOriginsScalar("SINCOS",inner,outer,0.1,25)
+        np.testing.assert_allclose(array,scalar,rtol=1e-9,atol=1e-9)
+
+
+class BakeTest(unittest.TestCase):
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+# Frames read back equal the frames calculated, in this process and by
+# worker processes.
+    def test_round_trip(self):
+        inner,outer=presetLoops("SINCOS",0.7)
+        frames=[(inner.parameters(),Loop(outer.loops+index,outer.step,\
+                    outer.freq,outer.radius,outer.offset).parameters())\
+                    for index in range(3)]
+        palette=("GRADIENT",((1.0,0.0,0.0),(0.0,0.0,1.0)))
+        for processes in (1,2):
+            path=os.path.join(self.directory,str(processes)+".bake")
+            bakeFrames(path,"SINCOS",0.1,5,frames,processes,palette=palette)
+            cache=PointCache()
+            cache.open(path)
+            try:
+                self.assertIsNone(cache.frame(4))
+                self.assertIsNone(cache.frame(8))
+                for index,(inner_parameters,outer_parameters) in\
+                        enumerate(frames):
+                    inner_frame=Loop(*inner_parameters)
+                    outer_frame=Loop(*outer_parameters)
+                    origins=patternOriginsArray("SINCOS",inner_frame,\
+                                outer_frame,0.1)
+                    colors=originColors(origins,\
+                                inner_frame.loops*outer_frame.loops,\
+                                paletteTable(*palette),"Z",palette[0])
+                    baked_origins,baked_colors=cache.frame(5+index)
+                    np.testing.assert_array_equal(baked_origins,\
+                                origins.astype(np.float32))
+                    np.testing.assert_array_equal(baked_colors,colors)
+            finally:
+                cache.close()
+
+# Files too short, of other content or cut off raise ValueError.
+    def test_not_a_bake_file(self):
+        inner,outer=presetLoops("SINCOS")
+        path=os.path.join(self.directory,"chain.bake")
+        bakeFrames(path,"SINCOS",0.1,1,[(inner.parameters(),\
+                    outer.parameters())])
+        with open(path,"rb") as file:
+            baked=file.read()
+        for content in (b"RCB",b"\0"*64,baked[:-8],baked[:24]+baked[-16:]):
+            with self.subTest(content=content[:8],length=len(content)):
+                path=os.path.join(self.directory,"other.bake")
+                with open(path,"wb") as file:
+                    file.write(content)
+                with self.assertRaises(ValueError):
+                    PointCache().open(path)
+
+
+class ExpressionTest(unittest.TestCase):
+    def test_unsafe_rejected(self):
+        for text in ("__import__('os').system('echo')","inner_count.real",\
+                    "(lambda: 1)()","().__class__","[inner_count]",\
+                    "'a'*9","open('file')","inner_count if 1 else 0",\
+                    "x"*1000,"-"*400+"1"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    compileExpression(text)
+
+    def test_axis_reported(self):
+        with self.assertRaises(ValueError) as context:
+            expressionPattern("inner_count","eval('1')","0")
+        self.assertTrue(str(context.exception).startswith("expression y"))
+
+# Integers would grow without bound, floats overflow to nan at once.
+    def test_float_results(self):
+        pattern=expressionPattern("floor(1e300)**floor(1e300)",\
+                    "ceil(1e300)**ceil(1e300)","9**9**9")
+        inner,outer=presetLoops("CUSTOM")
+        origin=pattern.scalar(inner,outer,1,1,1.0)
+        self.assertTrue(all(np.isnan(value) or np.isinf(value)\
+                        for value in origin))
+
+
+class ColorTest(unittest.TestCase):
+    def test_channels(self):
+        origins=np.array([(3.0,4.0,12.0),(0.0,0.0,-2.0)])
+        np.testing.assert_allclose(channelValues(origins,"Z"),(12,-2))
+        np.testing.assert_allclose(channelValues(origins,"RADIUS"),(5,0))
+        np.testing.assert_allclose(channelValues(origins,"DISTANCE"),(13,2))
+        with self.assertRaises(ValueError):
+            channelValues(origins,"W")
+
+    def test_stops(self):
+        self.assertEqual(stopColors("#ff0000, 00ff80,"),\
+                        ((255,0,0),(0,255,128)))
+        for text in ("#ff00","#gg0000"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    stopColors(text)
+
+    def test_palette_tables(self):
+        stops=((255,0,0),(0,0,255))
+        red,blue=packRgb(np.array(stops,dtype=np.float64))
+        gradient=paletteTable("GRADIENT",stops)
+        cyclic=paletteTable("CYCLIC",stops)
+        self.assertEqual(len(gradient),TABLE_SIZE)
+        self.assertEqual((gradient[0],gradient[-1]),(red,blue))
+        self.assertEqual(cyclic[0],red)
+        self.assertEqual(cyclic[TABLE_SIZE//2],blue)
+# Cyclic returns towards the first stop.
+        self.assertTrue(cyclic[-1]&0xff>0xf0)
+        with self.assertRaises(ValueError):
+            paletteTable("GRADIENT",())
+        with self.assertRaises(ValueError):
+            paletteTable("STRIPES",stops)
+
+# Gradients span smallest to largest channel value of any chain.
+    def test_gradient_range(self):
+        stops=((255,0,0),(0,255,0),(0,0,255))
+        table=paletteTable("GRADIENT",stops)
+        inner,outer=presetLoops("SINCOS",0.7)
+        origins=patternOriginsArray("SINCOS",inner,outer,0.1)
+        for channel in ("Z","RADIUS","DISTANCE"):
+            with self.subTest(channel=channel):
+                values=channelValues(origins,channel)
+                colors=originColors(origins,inner.loops*outer.loops,table,\
+                            channel,"GRADIENT")
+                self.assertEqual(colors[np.argmin(values)],table[0])
+                self.assertEqual(colors[np.argmax(values)],table[-1])
+                self.assertTrue(len(set(colors.tolist()))>2)
+
+    def test_rainbow_default(self):
+        inner,outer=presetLoops("CLOUD")
+        origins=patternOriginsArray("CLOUD",inner,outer,0.1)
+        drawings_max=inner.loops*outer.loops
+        np.testing.assert_array_equal(originColors(origins,drawings_max),\
+            originColors(origins,drawings_max,paletteTable(),"Z","RAINBOW"))
+
+
+class TransformTest(unittest.TestCase):
+# Values depend on seed and handle only, not on order or subset.
+    def test_random_per_handle(self):
+        handles=np.arange(1,101)
+        rotations,scales=elementTransforms(handles,None,None,"RANDOM",3,\
+                            0.1,0.2)
+        self.assertEqual(rotations.shape,(100,3))
+        self.assertTrue(((rotations>=-0.1)&(rotations<1.1)).all())
+        self.assertTrue(((scales>=0.8)&(scales<=1.2)).all())
+        subset=handles[::-7]
+        rotations_subset,scales_subset=elementTransforms(subset,None,None,\
+                            "RANDOM",3,0.1,0.2)
+        np.testing.assert_array_equal(rotations_subset,rotations[subset-1])
+        np.testing.assert_array_equal(scales_subset,scales[subset-1])
+        other,_=elementTransforms(handles,None,None,"RANDOM",4)
+        self.assertFalse(np.allclose(other,rotations))
+
+    def test_modes(self):
+        handles=np.arange(1,11)
+        rotations,scales=elementTransforms(handles,None,None,"KEEP")
+        self.assertIsNone(rotations)
+        self.assertIsNone(scales)
+        rotations,scales=elementTransforms(handles,None,None,"KEEP",1,0.5,0.5)
+        self.assertIsNone(rotations)
+        self.assertEqual(scales.shape,(10,3))
+        rotations,scales=elementTransforms(handles,None,None,"PATTERN")
+        np.testing.assert_array_equal(rotations,np.zeros((10,3)))
+        self.assertIsNone(scales)
+        pattern=np.ones((10,3))
+        rotations,scales=elementTransforms(handles,pattern,None,"PATTERN")
+        np.testing.assert_array_equal(rotations,pattern)
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self,*names):
+        with open(os.path.join(self.directory,*names),"rb") as file:
+            return file.read()
+
+# Files are equal whether written in chunks of a few rows or at once.
+    def test_chunks(self):
+        inner,outer=presetLoops("GAUSS",0.7)
+        chain=ChainParameters("GAUSS",inner,outer,0.1,\
+                    ("GRADIENT",((0,0,255),(255,0,0))),"DISTANCE")
+        transforms=("RANDOM",5,0.1,0.2)
+        for chunk_size in (7,10**6):
+            os.mkdir(os.path.join(self.directory,str(chunk_size)))
+        for name in ("chain.ply","chain.scn","chain_element.ply"):
+            with self.subTest(name=name):
+                if name!="chain_element.ply":
+                    written=[exportChain(os.path.join(self.directory,\
+                        str(chunk_size),name),chain,transforms,chunk_size)\
+                        for chunk_size in (7,10**6)]
+                    self.assertEqual(written,[chainCount(chain)]*2)
+                self.assertEqual(self.read("7",name),\
+                                self.read(str(10**6),name))
+
+    def test_ply_vertices(self):
+        inner,outer=presetLoops("SINCOS")
+        chain=ChainParameters("SINCOS",inner,outer)
+        path=os.path.join(self.directory,"chain.ply")
+        exportChain(path,chain,chunk_size=5)
+        content=self.read("chain.ply")
+        header,_,body=content.partition(b"end_header\n")
+        self.assertIn(b"element vertex "+str(chainCount(chain)).encode(),\
+                        header)
+        origins=chain.origins()
+        vertices=np.frombuffer(body,dtype=[("position","<f4",3),\
+                        ("rgb","u1",3),("id","<u4")])
+        np.testing.assert_array_equal(vertices["position"],\
+                        origins.astype(np.float32))
+        np.testing.assert_array_equal(vertices["id"],chain.colors(origins))
+
+    def test_extension(self):
+        inner,outer=presetLoops("SINCOS")
+        with self.assertRaises(ValueError):
+            exportChain(os.path.join(self.directory,"chain.obj"),\
+                    ChainParameters("SINCOS",inner,outer))
+
+
+class FlockTest(unittest.TestCase):
+    def setUp(self):
+        flock.flocks.clear()
+        self.inner=Loop(6,1,0.3,3,0.5)
+        self.outer=Loop(5,1,0.5,1,0.5)
+
+    def tearDown(self):
+        flock.flocks.clear()
+        setFrame(1)
+
+    def origins(self,frame,inner=None):
+        setFrame(frame)
+        return patternOriginsArray("FLOCK",inner or self.inner,self.outer,\
+                    0.1)
+
+# Going back continues from a checkpoint and gives the positions of a
+# simulation from frame 1.
+    def test_checkpoints(self):
+        forward=[self.origins(frame) for frame in range(1,26)]
+        self.assertFalse(np.allclose(forward[0],forward[-1]))
+        self.assertTrue(flock.flockOf(self.inner,self.outer).checkpoints)
+        for frame in (12,3,25,20):
+            with self.subTest(frame=frame):
+                np.testing.assert_array_equal(self.origins(frame),\
+                                forward[frame-1])
+        flock.flocks.clear()
+        np.testing.assert_array_equal(self.origins(17),forward[16])
+
+# Keyed parameters keep the flock, replaying the frames gives equal
+# positions.
+    def test_keyed_parameters(self):
+        def keyed(frame):
+            return Loop(6,1,0.3+frame*0.01,3,0.5)
+        forward=[self.origins(frame,keyed(frame)) for frame in range(1,26)]
+        self.assertEqual(len(flock.flocks),1)
+        for frame in range(14,26):
+            np.testing.assert_array_equal(self.origins(frame,keyed(frame)),\
+                            forward[frame-1])
+        self.origins(1,Loop(7,1,0.3,3,0.5))
+        self.assertEqual(len(flock.flocks),2)
+
+
+# Origin of test pattern, counters as x and y.
+def patternCounters(inner,outer,inner_count,outer_count,scale_factor):
+    return (inner_count*scale_factor,outer_count*scale_factor,0.0)
+
+
+class RegistryTest(unittest.TestCase):
+    def tearDown(self):
+        unregisterPattern("COUNTERS")
+
+    def test_register(self):
+        identifiers=[item[0] for item in patternItems()]
+        self.assertEqual(identifiers[:6],\
+            ["CLOUD","SINCOS","GAUSS","BOID","CUSTOM","FLOCK"])
+        registerPattern(Pattern("COUNTERS","Counters",patternCounters,\
+                    (3,1,0,0,0),(2,1,0,0,0)))
+        item=patternItems()[-1]
+        self.assertEqual(item[:2],("COUNTERS","Counters"))
+        self.assertEqual(item[3],len(identifiers)+1)
+        self.assertEqual(presetParameters("COUNTERS"),\
+            ("Counters",("Inner",3,1,0,0,0),("Outer",2,1,0,0,0)))
+# Patterns without array method are calculated point by point.
+        chain=ChainParameters.preset("COUNTERS",1.0)
+        np.testing.assert_array_equal(chain.origins(),\
+            [(0,0,0),(1,0,0),(2,0,0),(0,1,0),(1,1,0),(2,1,0)])
+        unregisterPattern("COUNTERS")
+        with self.assertRaises(KeyError):
+            patternOf("COUNTERS")
+        self.assertEqual(patternOf("SINCOS","rainbowchain.patterns").name,\
+                        presetParameters("SINCOS")[0])
+
+
+class CommandLineTest(unittest.TestCase):
+    def setUp(self):
+        self.directory=tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sweep(self):
+        path=os.path.join(self.directory,"sincos.npz")
+        with contextlib.redirect_stdout(io.StringIO()):
+            main(["SINCOS","--inner","4,1,1,3,0","--outer","3,0.5,1,3,0",\
+                "--sweep","inner_radius=1:2:3","--palette","GRADIENT",\
+                "-o",path])
+        with np.load(path) as arrays:
+            self.assertEqual(arrays["parameters"].shape,(3,12))
+            np.testing.assert_allclose(arrays["parameters"][:,3],(1,1.5,2))
+            origins=arrays["origins_0002"]
+            inner=Loop(4,1,1,1.5,0)
+            outer=Loop(3,0.5,1,3,0)
+            np.testing.assert_array_equal(origins,patternOriginsArray(\
+                "SINCOS",inner,outer,0.1).astype(np.float32))
+            self.assertEqual(len(arrays["colors_0003"]),12)
+
+    def test_errors(self):
+        path=os.path.join(self.directory,"chain.npz")
+        for argv in (["SINCOS","--stops","#zz0000","-o",path],\
+                    ["SINCOS","--palette","CYCLIC","--stops",",","-o",path],\
+                    ["SINCOS","--inner","1,2","-o",path],\
+                    ["CUSTOM","--expression","x","0","0","-o",path],\
+                    ["NONE","-o",path]):
+            with self.subTest(argv=argv):
+                with contextlib.redirect_stderr(io.StringIO()):
+                    with self.assertRaises(SystemExit):
+                        main(argv)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__=="__main__":
+    unittest.main()